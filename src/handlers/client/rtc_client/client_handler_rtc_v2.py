@@ -62,7 +62,8 @@ class RtcClientSessionDelegate(ClientSessionDelegate):
         return data
 
     def put_data(self, modality: EngineChannelType, data: Union[np.ndarray, str],
-                 timestamp: Optional[Tuple[int, int]] = None, samplerate: Optional[int] = None, loopback: bool = False):
+                 timestamp: Optional[Tuple[int, int]] = None, samplerate: Optional[int] = None, loopback: bool = False,
+                 meta_data: Optional[Dict] = None):
         if timestamp is None:
             timestamp = self.get_timestamp()
         if self.data_submitter is None:
@@ -82,6 +83,9 @@ class RtcClientSessionDelegate(ClientSessionDelegate):
             data_bundle.set_main_data(data)
         else:
             return
+        if meta_data:
+            for key, value in meta_data.items():
+                data_bundle.add_meta(key, value)
         chat_data = ChatData(
             source="client",
             type=chat_data_type,
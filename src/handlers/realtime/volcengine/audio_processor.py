@@ -1,8 +1,64 @@
 import pyaudio
 import asyncio
+import base64
+import math
+import mmap
+import struct
 import threading
 import time
-from typing import Dict, Any, Optional, Callable, Awaitable
+import wave
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+
+try:
+    import soundfile as sf
+    from scipy import signal
+    AUDIO_LIBS_AVAILABLE = True
+except ImportError:
+    AUDIO_LIBS_AVAILABLE = False
+
+# 整型PCM转float32的缩放系数，用乘法代替逐样本除法
+_INT16_SCALE = np.float32(1.0 / 32768.0)
+_INT32_SCALE = np.float32(1.0 / 2147483648.0)
+_INT_SCALES = {np.dtype(np.int16): _INT16_SCALE, np.dtype(np.int32): _INT32_SCALE}
+# 线性插值重采样的时间轴缓存条目上限
+_RESAMPLE_AXIS_CACHE_SIZE = 32
+# 标准44字节WAV头（RIFF头 + 16字节fmt块 + data块头）一次解包
+_WAV_HEADER = struct.Struct('<4sI4s4sIHHIIHH4sI')
+_WAV_CHUNK_HEADER = struct.Struct('<4sI')
+
+
+def _locate_pcm16_wav_data(wav_bytes) -> tuple:
+    """定位16位PCM WAV的data块，返回(数据偏移, 按整帧截断的数据字节数, 声道数, 采样率)"""
+    if len(wav_bytes) < _WAV_HEADER.size:
+        raise ValueError("WAV数据长度不足")
+    (riff_id, _, wave_id, fmt_id, fmt_size, audio_format, channels, sample_rate,
+     _, _, bits_per_sample, data_id, data_size) = _WAV_HEADER.unpack_from(wav_bytes, 0)
+    if riff_id != b'RIFF' or wave_id != b'WAVE' or fmt_id != b'fmt ':
+        raise ValueError("不是有效的WAV数据")
+    if audio_format != 1 or bits_per_sample != 16:
+        raise ValueError(f"仅支持16位PCM WAV: format={audio_format}, bits={bits_per_sample}")
+    
+    data_offset = _WAV_HEADER.size
+    if data_id != b'data':
+        # fmt块带扩展字段或data前还有LIST等其他块，从fmt块之后逐块查找data块
+        offset = 20 + fmt_size
+        while offset + _WAV_CHUNK_HEADER.size <= len(wav_bytes):
+            chunk_id, chunk_size = _WAV_CHUNK_HEADER.unpack_from(wav_bytes, offset)
+            offset += _WAV_CHUNK_HEADER.size
+            if chunk_id == b'data':
+                data_offset, data_size = offset, chunk_size
+                break
+            offset += chunk_size + (chunk_size & 1)
+        else:
+            raise ValueError("WAV数据中没有data块")
+    
+    frame_bytes = 2 * channels
+    data_length = min(data_size, len(wav_bytes) - data_offset)
+    data_length -= data_length % frame_bytes
+    return data_offset, data_length, channels, sample_rate
 
 
 class AudioConfig:
@@ -189,8 +245,6 @@ class DialogSession:
     async def process_audio_file(self, file_path: str):
         """处理音频文件"""
         try:
-            import wave
-            
             with wave.open(file_path, 'rb') as wav_file:
                 frames = wav_file.readframes(wav_file.getnframes())
                 
@@ -216,7 +270,6 @@ class DialogSession:
                 if 'audio' in response:
                     audio_data = response['audio']
                     if isinstance(audio_data, str):
-                        import base64
                         audio_data = base64.b64decode(audio_data)
                     
                     # 添加到播放缓冲区
@@ -244,22 +297,264 @@ class DialogSession:
 class AudioProcessor:
     """音频处理器兼容性类"""
     
-    def __init__(self):
-        pass
+    def __init__(self, target_sample_rate: int = 16000, target_channels: int = 1,
+                 chunk_size: int = 1024, overlap_size: int = 256):
+        self.target_sample_rate = target_sample_rate
+        self.target_channels = target_channels
+        self.chunk_size = chunk_size
+        self.overlap_size = overlap_size
+        if overlap_size >= chunk_size:
+            raise ValueError("overlap_size必须小于chunk_size")
+        self.processed_samples = 0
+        # 预分配的分块缓冲区，[_head, _tail)为尚未输出的样本，写满时把剩余样本搬回开头
+        self._ring = np.empty(chunk_size * 8, dtype=np.float32)
+        self._head = 0
+        self._tail = 0
+        # (输入类型, 维度, 采样率) -> 专用处理函数
+        self._process_paths: Dict[tuple, Callable[[np.ndarray], np.ndarray]] = {}
+        # (原采样率, 目标采样率, 样本数) -> (原时间轴, 新时间轴)
+        self._resample_axis_cache: Dict[tuple, tuple] = {}
+        # float32中间结果的复用缓冲区，按需倍增
+        self._f32_scratch = np.empty(chunk_size, dtype=np.float32)
+        # 按长度缓存的Hann窗，默认块长度预先生成
+        self._window_cache: Dict[int, np.ndarray] = {chunk_size: np.hanning(chunk_size).astype(np.float32)}
+        # 预乘int16满幅的分块窗，批量输出时加窗与缩放合并为一次乘法
+        self._scaled_window = self._window_cache[chunk_size] * np.float32(32767.0)
+    
+    @property
+    def audio_buffer(self) -> np.ndarray:
+        """缓冲区中尚未输出的样本（视图）"""
+        return self._ring[self._head:self._tail]
+    
+    def add_to_buffer(self, audio: np.ndarray) -> List[np.ndarray]:
+        """追加float32音频，按chunk_size和overlap_size切出所有完整的块，返回加窗后的int16块"""
+        audio = audio.reshape(-1)
+        n = audio.size
+        if self._tail + n > self._ring.size:
+            self._compact(n)
+        self._ring[self._tail:self._tail + n] = audio
+        self._tail += n
+        
+        pending = self._tail - self._head
+        if pending < self.chunk_size:
+            return []
+        # 所有就绪块以跨步视图一次取出，加窗、缩放、截断和取整对整批块一起完成
+        hop = self.chunk_size - self.overlap_size
+        count = (pending - self.chunk_size) // hop + 1
+        frames = sliding_window_view(self._ring[self._head:self._tail], self.chunk_size)[::hop][:count]
+        scratch = self._get_f32_scratch(frames.shape)
+        np.multiply(frames, self._scaled_window, out=scratch)
+        np.clip(scratch, -32767.0, 32767.0, out=scratch)
+        np.floor(scratch, out=scratch)
+        self._head += count * hop
+        self.processed_samples += count * hop
+        return list(scratch.astype(np.int16))
+    
+    def flush_buffer(self) -> Optional[np.ndarray]:
+        """输出缓冲区剩余样本，不足chunk_size的部分补零，缓冲区为空时返回None"""
+        pending = self._tail - self._head
+        if pending == 0:
+            return None
+        chunk = np.zeros(self.chunk_size, dtype=np.float32)
+        chunk[:pending] = self._ring[self._head:self._tail]
+        self.processed_samples += pending
+        self._head = self._tail = 0
+        return self._float32_to_int16(self._apply_window(chunk))
+    
+    def reset_buffer(self):
+        """清空缓冲区并重置已处理样本计数"""
+        self._head = self._tail = 0
+        self.processed_samples = 0
+    
+    def _compact(self, incoming: int):
+        """把未输出的样本搬到缓冲区开头，空间仍不够时扩容"""
+        pending = self._tail - self._head
+        needed = pending + incoming
+        if needed > self._ring.size:
+            ring = np.empty(max(needed, self._ring.size * 2), dtype=np.float32)
+            ring[:pending] = self._ring[self._head:self._tail]
+            self._ring = ring
+        else:
+            self._ring[:pending] = self._ring[self._head:self._tail]
+        self._head = 0
+        self._tail = pending
+    
+    def process_audio(self, audio_data: np.ndarray, sample_rate: int) -> np.ndarray:
+        """将输入音频转换为目标采样率的float32格式"""
+        key = (audio_data.dtype, audio_data.ndim, sample_rate)
+        path = self._process_paths.get(key)
+        if path is None:
+            path = self._process_paths[key] = self._select_process_path(*key)
+        return path(audio_data)
+    
+    def _select_process_path(self, dtype: np.dtype, ndim: int, sample_rate: int) -> Callable[[np.ndarray], np.ndarray]:
+        """按(输入类型, 维度, 采样率)生成只包含所需步骤的处理函数"""
+        if ndim > 1 and self.target_channels == 1:
+            convert = self._downmix_to_mono
+        elif dtype in _INT_SCALES:
+            scale = _INT_SCALES[dtype]
+            
+            def convert(audio_data):
+                return np.multiply(audio_data, scale, dtype=np.float32)
+        else:
+            convert = self._to_float32
+        
+        if sample_rate == self.target_sample_rate:
+            return convert
+        target_sample_rate = self.target_sample_rate
+        
+        def convert_and_resample(audio_data):
+            audio = convert(audio_data)
+            if audio.size == 0:
+                return audio
+            return self._resample(audio, sample_rate, target_sample_rate)
+        return convert_and_resample
+    
+    def _resample(self, audio: np.ndarray, src_rate: int, dst_rate: int) -> np.ndarray:
+        """重采样，有scipy时使用多相滤波，否则退回线性插值"""
+        if AUDIO_LIBS_AVAILABLE:
+            g = math.gcd(src_rate, dst_rate)
+            resampled = signal.resample_poly(audio, dst_rate // g, src_rate // g)
+            return resampled.astype(np.float32, copy=False)
+        return self._simple_resample(audio, src_rate, dst_rate)
+    
+    def _simple_resample(self, audio: np.ndarray, src_rate: int, dst_rate: int) -> np.ndarray:
+        """线性插值重采样，同一(采样率, 长度)组合的时间轴只计算一次"""
+        key = (src_rate, dst_rate, audio.size)
+        axes = self._resample_axis_cache.get(key)
+        if axes is None:
+            new_length = max(1, int(round(audio.size * dst_rate / src_rate)))
+            old_t = np.arange(audio.size, dtype=np.float64)
+            new_t = np.linspace(0, audio.size - 1, new_length, dtype=np.float64)
+            if len(self._resample_axis_cache) >= _RESAMPLE_AXIS_CACHE_SIZE:
+                self._resample_axis_cache.clear()
+            axes = self._resample_axis_cache[key] = (old_t, new_t)
+        old_t, new_t = axes
+        return np.interp(new_t, old_t, audio).astype(np.float32, copy=False)
+    
+    def _get_f32_scratch(self, shape) -> np.ndarray:
+        """返回指定形状的float32复用缓冲区视图，容量不足时按倍数扩容"""
+        n = math.prod(shape)
+        if self._f32_scratch.size < n:
+            self._f32_scratch = np.empty(max(n, self._f32_scratch.size * 2), dtype=np.float32)
+        return self._f32_scratch[:n].reshape(shape)
+    
+    @staticmethod
+    def _normalize_audio(audio: np.ndarray) -> np.ndarray:
+        """按峰值归一化到[-1, 1]，峰值由max/min得出，不生成abs临时数组"""
+        if audio.size == 0:
+            return audio.astype(np.float32, copy=False)
+        peak = max(float(audio.max()), -float(audio.min()))
+        if peak == 0:
+            return audio.astype(np.float32, copy=False)
+        normalized = np.multiply(audio, np.float32(1.0 / peak), dtype=np.float32)
+        # 乘以倒数可能比1多出一个ulp，原地截断保证范围
+        return np.clip(normalized, -1.0, 1.0, out=normalized)
+    
+    def _apply_window(self, chunk: np.ndarray) -> np.ndarray:
+        """对音频块应用Hann窗"""
+        window = self._window_cache.get(chunk.size)
+        if window is None:
+            window = self._window_cache[chunk.size] = np.hanning(chunk.size).astype(np.float32)
+        return np.multiply(chunk, window, dtype=np.float32)
+    
+    def _float32_to_int16(self, float_data: np.ndarray) -> np.ndarray:
+        """float32转int16：缩放、截断和取整在复用缓冲区中原地完成，只在最终转换时分配输出"""
+        scratch = self._get_f32_scratch(float_data.shape)
+        np.multiply(float_data, np.float32(32767.0), out=scratch)
+        np.clip(scratch, -32767.0, 32767.0, out=scratch)
+        np.floor(scratch, out=scratch)
+        return scratch.astype(np.int16)
+    
+    @staticmethod
+    def _downmix_to_mono(audio_data: np.ndarray) -> np.ndarray:
+        """多声道(样本, 声道)取均值转为单声道，累加时直接按float32计算"""
+        mono = np.mean(audio_data, axis=-1, dtype=np.float32)
+        scale = _INT_SCALES.get(audio_data.dtype)
+        if scale is not None:
+            mono *= scale
+        return mono
+    
+    @staticmethod
+    def _to_float32(audio_data: np.ndarray) -> np.ndarray:
+        """整型PCM按位宽缩放到[-1, 1)，类型转换与缩放在一次遍历中完成"""
+        if audio_data.dtype == np.int16:
+            return np.multiply(audio_data, _INT16_SCALE, dtype=np.float32)
+        if audio_data.dtype == np.int32:
+            return np.multiply(audio_data, _INT32_SCALE, dtype=np.float32)
+        return audio_data.astype(np.float32, copy=False)
+    
+    def get_audio_info(self, audio_data: np.ndarray, sample_rate: int) -> Dict[str, Any]:
+        """获取音频的时长、声道、样本数以及RMS和峰值电平"""
+        samples = audio_data.shape[0] if audio_data.ndim > 0 else 0
+        channels = audio_data.shape[-1] if audio_data.ndim > 1 else 1
+        flat = audio_data.reshape(-1)
+        if flat.dtype.kind != 'f':
+            # 整型点积会溢出，按原始幅值转为浮点计算
+            flat = flat.astype(np.float64)
+        if flat.size > 0:
+            # 平方和用点积一次求出，峰值由max/min得出
+            rms_level = math.sqrt(float(np.dot(flat, flat)) / flat.size)
+            peak_level = max(float(flat.max()), -float(flat.min()))
+        else:
+            rms_level = peak_level = 0.0
+        return {
+            'duration': samples / sample_rate if sample_rate else 0.0,
+            'sample_rate': sample_rate,
+            'channels': channels,
+            'samples': samples,
+            'rms_level': rms_level,
+            'peak_level': peak_level,
+        }
+    
+    def _parse_basic_wav(self, wav_bytes: bytes):
+        """解析16位PCM WAV数据，返回(float32音频, 采样率)，多声道时形状为(样本, 声道)"""
+        data_offset, data_length, channels, sample_rate = _locate_pcm16_wav_data(wav_bytes)
+        samples = np.frombuffer(wav_bytes, dtype=np.int16, count=data_length // 2, offset=data_offset)
+        audio = np.multiply(samples, _INT16_SCALE, dtype=np.float32)
+        if channels > 1:
+            audio = audio.reshape(-1, channels)
+        return audio, sample_rate
+    
+    @staticmethod
+    def stream_int16_from_file(file_path: str, chunk_size: int):
+        """按chunk_size帧逐块产出WAV文件的int16 PCM数据（bytes），16位PCM文件经mmap按需切片，不整段读入内存"""
+        with open(file_path, 'rb') as f:
+            try:
+                wav_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # 空文件无法映射
+                raise ValueError("WAV数据长度不足")
+            # 映射在生成器整个生命周期内保持打开；产出的块是独立的bytes，调用方可跨越生成器结束继续持有
+            with wav_map:
+                try:
+                    data_offset, data_length, channels, _ = _locate_pcm16_wav_data(wav_map)
+                except ValueError:
+                    if not AUDIO_LIBS_AVAILABLE:
+                        raise
+                    data_length = None
+                if data_length is not None:
+                    chunk_bytes = chunk_size * 2 * channels
+                    data_end = data_offset + data_length
+                    for offset in range(data_offset, data_end, chunk_bytes):
+                        yield wav_map[offset:min(offset + chunk_bytes, data_end)]
+                    return
+        # 非16位PCM的文件交给libsndfile转换
+        samples, _ = sf.read(file_path, dtype='int16')
+        channels = samples.shape[1] if samples.ndim > 1 else 1
+        pcm = memoryview(samples.tobytes())
+        chunk_bytes = chunk_size * 2 * channels
+        for offset in range(0, len(pcm), chunk_bytes):
+            yield pcm[offset:offset + chunk_bytes]
     
     def process_audio_bytes(self, audio_data: bytes, target_sample_rate: int = 16000, target_channels: int = 1):
         """处理音频字节数据（兼容性方法）"""
         # 简单返回原始数据，实际项目中可能需要重采样等处理
-        import numpy as np
         return np.frombuffer(audio_data, dtype=np.int16)
     
     def load_audio_file(self, file_path: str):
-        """加载音频文件（兼容性方法）"""
-        try:
-            import wave
-            with wave.open(file_path, 'rb') as wav_file:
-                frames = wav_file.readframes(wav_file.getnframes())
-                return frames
-        except Exception as e:
-            print(f"Failed to load audio file: {e}")
-            return None
\ No newline at end of file
+        """加载音频文件并转换为目标采样率的float32数据"""
+        if not AUDIO_LIBS_AVAILABLE:
+            raise RuntimeError("加载音频文件需要安装soundfile和scipy")
+        audio_data, sample_rate = sf.read(file_path, dtype='float32')
+        return self.process_audio(audio_data, sample_rate)
\ No newline at end of file
@@ -1,6 +1,12 @@
 import json
 import gzip
+import base64
+import struct
+import zlib
+from enum import Enum
 from typing import Dict, Any, Optional, Union
+
+import numpy as np
 from loguru import logger
 from protocol_parser import (
     generate_header, parse_response, extract_audio_data, 
@@ -349,6 +355,111 @@ class ProtocolHandler:
         }
 
 
+class MessageType(Enum):
+    """VOLC消息头中的消息类型"""
+    AUDIO_ONLY_SERVER_ACK = 0x11
+    AUDIO_ONLY_CLIENT_REQUEST = 0x12
+    FULL_CLIENT_REQUEST = 0x13
+    FULL_SERVER_RESPONSE = 0x14
+    ERROR_RESPONSE = 0x15
+
+
+class AudioFormat(Enum):
+    """音频格式编号"""
+    PCM_16K_16BIT_MONO = 1
+    PCM_24K_16BIT_MONO = 2
+    PCM_8K_16BIT_MONO = 3
+
+
+# 采样率到音频格式的映射，不支持的采样率按16kHz处理
+_AUDIO_FORMAT_BY_RATE = {
+    8000: AudioFormat.PCM_8K_16BIT_MONO,
+    16000: AudioFormat.PCM_16K_16BIT_MONO,
+    24000: AudioFormat.PCM_24K_16BIT_MONO,
+}
+
+# 16字节消息头: magic(4s) + msg_type(B) + flags(B) + seq_id(H) + payload_len(I) + req_hash(I)，大端序
+_VOLC_MAGIC = b'VOLC'
+_VOLC_HEADER = struct.Struct('>4sBBHII')
+_FLAG_LAST = 0x01
+
+
+class VolcEngineProtocolHandler:
+    """VOLC消息编码器：16字节定长消息头 + int16 PCM或JSON载荷"""
+    
+    def __init__(self, sample_rate: int = 16000, channels: int = 1, bit_depth: int = 16):
+        """
+        初始化协议处理器
+        
+        Args:
+            sample_rate: 采样率
+            channels: 声道数
+            bit_depth: 位深
+        """
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.bit_depth = bit_depth
+        self.sequence_id = 0
+        self.audio_format = _AUDIO_FORMAT_BY_RATE.get(sample_rate, AudioFormat.PCM_16K_16BIT_MONO)
+    
+    def encode_audio_message(self, audio_data: np.ndarray, is_last: bool = False,
+                             request_id: Optional[str] = None) -> bytes:
+        """
+        编码纯音频消息
+        
+        Args:
+            audio_data: 音频数据，浮点数据按[-1, 1]换算为int16
+            is_last: 是否为最后一个音频包
+            request_id: 请求ID，以CRC32写入消息头
+            
+        Returns:
+            bytes: 编码后的消息
+        """
+        payload = self._to_pcm16(audio_data).tobytes()
+        return self._encode(MessageType.AUDIO_ONLY_CLIENT_REQUEST, payload, is_last, request_id)
+    
+    def encode_full_request(self, audio_data: np.ndarray, text_data: str, is_last: bool = False,
+                            request_id: Optional[str] = None) -> bytes:
+        """
+        编码完整请求：音频参数、文本和base64编码的音频一起放入JSON载荷
+        
+        Args:
+            audio_data: 音频数据
+            text_data: 文本数据
+            is_last: 是否为最后一个请求
+            request_id: 请求ID
+            
+        Returns:
+            bytes: 编码后的消息
+        """
+        payload = {
+            "audio_format": self.audio_format.value,
+            "sample_rate": self.sample_rate,
+            "channels": self.channels,
+            "text_data": text_data,
+            "is_last": is_last,
+            "audio_data": base64.b64encode(self._to_pcm16(audio_data).tobytes()).decode('ascii'),
+        }
+        return self._encode(MessageType.FULL_CLIENT_REQUEST, json.dumps(payload).encode('utf-8'),
+                            is_last, request_id)
+    
+    def _encode(self, msg_type: MessageType, payload: bytes, is_last: bool, request_id: Optional[str]) -> bytes:
+        """拼接消息头和载荷，序列号先递增再写入，超过65535回到0"""
+        self.sequence_id = (self.sequence_id + 1) & 0xFFFF
+        req_hash = zlib.crc32(request_id.encode('utf-8')) if request_id else 0
+        header = _VOLC_HEADER.pack(_VOLC_MAGIC, msg_type.value, _FLAG_LAST if is_last else 0x00,
+                                   self.sequence_id, len(payload), req_hash)
+        return header + payload
+    
+    @staticmethod
+    def _to_pcm16(audio_data: np.ndarray) -> np.ndarray:
+        """转换为小端int16，浮点数据先截断到[-1, 1]再乘以32767"""
+        audio_data = np.asarray(audio_data)
+        if np.issubdtype(audio_data.dtype, np.floating):
+            audio_data = np.clip(audio_data, -1.0, 1.0) * 32767
+        return audio_data.astype('<i2', copy=False)
+
+
 # 兼容性函数
 def create_protocol_handler(use_compression: bool = True, 
                           use_protobuf: bool = False) -> ProtocolHandler:
@@ -1,5 +1,6 @@
 import gzip
 import json
+import struct
 from typing import Dict, Any, Optional
 
 PROTOCOL_VERSION = 0b0001
@@ -55,6 +56,9 @@ CUSTOM_COMPRESSION = 0b1111
 COMPRESSION_NONE = NO_COMPRESSION
 COMPRESSION_GZIP = GZIP
 
+_UINT32 = struct.Struct(">I")
+_INT32 = struct.Struct(">i")
+
 
 def generate_header(
         version=PROTOCOL_VERSION,
@@ -100,50 +104,42 @@ def parse_response(res):
           -- session ID data
         - (4 bytes)data len
         - data
+
+    帧在上述定长字段处被截断时抛出struct.error，由调用方按解析失败处理
     """
     if isinstance(res, str):
         return {}
-    protocol_version = res[0] >> 4
+    # 按偏移直接从原始帧读取各字段，只在取载荷时切片一次
     header_size = res[0] & 0x0f
     message_type = res[1] >> 4
     message_type_specific_flags = res[1] & 0x0f
     serialization_method = res[2] >> 4
     message_compression = res[2] & 0x0f
-    reserved = res[3]
-    header_extensions = res[4:header_size * 4]
-    payload = res[header_size * 4:]
+    offset = header_size * 4
     result = {}
-    payload_msg = None
-    payload_size = 0
-    start = 0
     if message_type == SERVER_FULL_RESPONSE or message_type == SERVER_ACK:
-        result['message_type'] = 'SERVER_FULL_RESPONSE'
-        if message_type == SERVER_ACK:
-            result['message_type'] = 'SERVER_ACK'
-        if message_type_specific_flags & NEG_SEQUENCE > 0:
-            result['seq'] = int.from_bytes(payload[:4], "big", signed=False)
-            start += 4
-        if message_type_specific_flags & MSG_WITH_EVENT > 0:
-            result['event'] = int.from_bytes(payload[:4], "big", signed=False)
-            start += 4
-        payload = payload[start:]
-        session_id_size = int.from_bytes(payload[:4], "big", signed=True)
-        session_id = payload[4:session_id_size+4]
-        result['session_id'] = str(session_id)
-        payload = payload[4 + session_id_size:]
-        payload_size = int.from_bytes(payload[:4], "big", signed=False)
-        payload_msg = payload[4:]
+        result['message_type'] = 'SERVER_ACK' if message_type == SERVER_ACK else 'SERVER_FULL_RESPONSE'
+        if message_type_specific_flags & NEG_SEQUENCE:
+            result['seq'] = _UINT32.unpack_from(res, offset)[0]
+            offset += 4
+        if message_type_specific_flags & MSG_WITH_EVENT:
+            result['event'] = _UINT32.unpack_from(res, offset)[0]
+            offset += 4
+        session_id_size = _INT32.unpack_from(res, offset)[0]
+        offset += 4
+        result['session_id'] = str(res[offset:offset + session_id_size])
+        offset += session_id_size
     elif message_type == SERVER_ERROR_RESPONSE:
-        code = int.from_bytes(payload[:4], "big", signed=False)
-        result['code'] = code
-        payload_size = int.from_bytes(payload[4:8], "big", signed=False)
-        payload_msg = payload[8:]
-    if payload_msg is None:
+        result['code'] = _UINT32.unpack_from(res, offset)[0]
+        offset += 4
+    else:
         return result
+    payload_size = _UINT32.unpack_from(res, offset)[0]
+    payload_msg = res[offset + 4:]
     if message_compression == GZIP:
         payload_msg = gzip.decompress(payload_msg)
     if serialization_method == JSON:
-        payload_msg = json.loads(str(payload_msg, "utf-8"))
+        payload_msg = json.loads(payload_msg)
     elif serialization_method != NO_SERIALIZATION:
         payload_msg = str(payload_msg, "utf-8")
     result['payload_msg'] = payload_msg
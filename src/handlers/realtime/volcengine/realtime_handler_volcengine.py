@@ -19,6 +19,7 @@ import time
 import uuid
 import wave
 from abc import ABC
+from collections import Counter
 from datetime import datetime
 from typing import Optional, Dict, Any
 
@@ -33,11 +34,15 @@ from chat_engine.data_models.chat_data_type import ChatDataType
 from chat_engine.data_models.chat_engine_config_data import ChatEngineConfigModel, HandlerBaseConfigModel
 from chat_engine.data_models.runtime_data.data_bundle import DataBundleDefinition, DataBundleEntry, DataBundleEntry
 from pydantic import BaseModel, Field
+from websockets.exceptions import ConnectionClosed
 
 from volcengine_client import VolcEngineRealtimeClient
 from audio_processor import AudioConfig, AudioDeviceManager, DialogSession, AudioProcessor
 from audio_recorder import AudioRecorder, AudioPlayer
 
+# 载荷为大块音频数据的事件，日志中只输出载荷前缀
+_NOISY_EVENTS = frozenset({352})
+
 
 class VolcEngineRealtimeConfig(HandlerBaseConfigModel):
     """火山引擎实时对话配置模型"""
@@ -544,6 +549,14 @@ class HandlerVolcEngineRealtime(HandlerBase, ABC):
                 except Exception as e:
                     self.logger.error(f"[VOLCENGINE_CONNECT] 清理连接时出错: {e}")
             
+            # 停止客户端后台收发协程并关闭WebSocket，下次start_connection时会重新建立
+            if context.client is not None:
+                try:
+                    await context.client.close()
+                except Exception as e:
+                    self.logger.error(f"[VOLCENGINE_CONNECT] 关闭客户端时出错: {e}")
+                context.is_connected = False
+            
             self.logger.info(f"[VOLCENGINE_CONNECT] 会话处理完成，准备下次连接: {context.session_id}")
     
     def _output_loop(self, context: VolcEngineRealtimeContext):
@@ -698,6 +711,7 @@ class HandlerVolcEngineRealtime(HandlerBase, ABC):
     
     async def _send_temp_file_and_wait_response(self, context: VolcEngineRealtimeContext, temp_file_path: str):
         """发送临时文件到服务器并等待响应"""
+        file_client = None
         try:
             self.logger.info(f"[VOLCENGINE_FILE_SEND] 开始发送临时文件: {temp_file_path}")
             
@@ -738,8 +752,8 @@ class HandlerVolcEngineRealtime(HandlerBase, ABC):
             }
             file_client = VolcEngineRealtimeClient(file_client_config, context.session_id)
             
-            # 设置响应收集变量
-            received_responses = []
+            # 设置响应统计变量（只统计事件分布，不保留响应本身）
+            response_event_counter: Counter = Counter()
             session_finished_event = asyncio.Event()
             
             # 连接到服务器
@@ -755,29 +769,17 @@ class HandlerVolcEngineRealtime(HandlerBase, ABC):
             await file_client.start_session(start_session_req)
             self.logger.info(f"协议启动完毕")
             # 读取并发送音频文件
-            import wave
-            
             try:
-                with wave.open(temp_file_path, 'rb') as wav_file:
-                    chunk_size = file_client_config["input_audio_config"]["chunk"]
-                    self.logger.info(f"开始处理音频文件: {temp_file_path}")
-                    while True:
-                        audio_data = wav_file.readframes(chunk_size)
-                        if not audio_data:
-                            break
-                        
-                        await file_client.send_audio_data(audio_data)
-                        # sent_frames += frames_to_read
-                        
-                        # 等待20ms模拟实时发送
-                        # await asyncio.sleep(0.02)
-                        
-                        # 检查是否收到完整响应
-                        # if session_finished_event.is_set():
-                        #     self.logger.info(f"[VOLCENGINE_FILE_SEND] 收到完整响应，停止发送音频")
-                        #     break
-                    
-                    self.logger.info(f"[VOLCENGINE_FILE_SEND] 音频文件发送完成")
+                # 16位PCM文件的数据块直接按帧切片发送，不经过int16数组和整段tobytes拷贝
+                chunk_size = file_client_config["input_audio_config"]["chunk"]
+                self.logger.info(f"开始处理音频文件: {temp_file_path}")
+                for pcm_chunk in AudioProcessor.stream_int16_from_file(temp_file_path, chunk_size):
+                    await file_client.send_audio_data(pcm_chunk)
+                    # 等待20ms模拟实时发送
+                    # await asyncio.sleep(0.02)
+                await file_client.flush()
+
+                self.logger.info(f"[VOLCENGINE_FILE_SEND] 音频文件发送完成")
                     
             except Exception as e:
                 self.logger.error(f"[VOLCENGINE_FILE_SEND] 发送音频文件时出错: {e}")
@@ -808,11 +810,9 @@ class HandlerVolcEngineRealtime(HandlerBase, ABC):
                     while not session_finished_event.is_set():
                         try:
                             response = await asyncio.wait_for(file_client.receive_server_response(), timeout=1.0)
-                            received_responses.append(response)
-                            if response['event'] != 352:
-                                self.logger.info(f"[VOLCENGINE_FILE_SEND] 收到服务器响应: {response}")
-                            else:
-                                self.logger.info(f"[VOLCENGINE_FILE_SEND] 收到服务器音频响应，前100字符为: {response['payload_msg'][0:100]}")
+                            response_event_counter[response.get('event')] += 1
+                            self._log_response("[VOLCENGINE_FILE_SEND] 收到服务器响应",
+                                               response_event_counter.total(), response)
                             
                             # 解析和处理响应数据
                             await self._parse_and_handle_response(context, response)
@@ -862,13 +862,9 @@ class HandlerVolcEngineRealtime(HandlerBase, ABC):
                         pass
             
             # 记录收到的响应
-            if received_responses:
-                self.logger.info(f"[VOLCENGINE_FILE_SEND] 共收到 {len(received_responses)} 个服务器响应")
-                for i, response in enumerate(received_responses):
-                    if response["event"]!=352:
-                        self.logger.info(f"[VOLCENGINE_FILE_SEND] 响应 #{i+1}: {response}")
-                    else:
-                        self.logger.info(f"[VOLCENGINE_FILE_SEND] 音频响应 #{i+1}，前百字符为: {response['payload_msg'][0:100]}")
+            if response_event_counter:
+                self.logger.info(f"[VOLCENGINE_FILE_SEND] 共收到 {response_event_counter.total()} 个服务器响应，"
+                                 f"事件分布: {dict(response_event_counter)}")
             else:
                 self.logger.warning(f"[VOLCENGINE_FILE_SEND] 未收到任何服务器响应")
             
@@ -889,7 +885,26 @@ class HandlerVolcEngineRealtime(HandlerBase, ABC):
             self.logger.error(f"[VOLCENGINE_FILE_SEND] 发送临时文件时出错: {e}")
             import traceback
             self.logger.error(f"[VOLCENGINE_FILE_SEND] 错误堆栈: {traceback.format_exc()}")
+        finally:
+            # 每次发送文件都新建客户端，无论正常结束还是中途返回都要关闭，停止其后台收发协程
+            if file_client is not None:
+                try:
+                    await file_client.close()
+                except Exception as e:
+                    self.logger.warning(f"[VOLCENGINE_FILE_SEND] 关闭文件发送客户端时出错: {e}")
     
+    def _log_response(self, tag: str, index: int, response: Dict[str, Any]):
+        """记录服务器响应，音频类事件只输出载荷前100字节，格式化延迟到日志实际输出时"""
+        event = response.get('event')
+        if event in _NOISY_EVENTS:
+            # 先切片再交给日志格式化，避免为整段音频载荷生成repr
+            payload = response.get('payload_msg', b'')
+            if isinstance(payload, (bytes, bytearray, str)):
+                payload = payload[:100]
+            self.logger.info("{} #{} 事件: {}，载荷前100字节为: {}", tag, index, event, payload)
+        else:
+            self.logger.info("{} #{}: {}", tag, index, response)
+
     async def _handle_audio_input(self, context: VolcEngineRealtimeContext):
         """处理音频输入的异步任务"""
         self.logger.info(f"[VOLCENGINE_AUDIO] 开始音频输入处理循环: {context.session_id}")
@@ -923,34 +938,39 @@ class HandlerVolcEngineRealtime(HandlerBase, ABC):
         try:
             if not response:
                 return
-                
-            message_type = response.get('message_type')
+
             event = response.get('event')
+
+            # TTS音频数据事件（352）是最频繁的消息，跳过日志和后续分支直接处理
+            if event == 352:
+                payload_msg = response.get('payload_msg')
+                if isinstance(payload_msg, bytes):
+                    await self._handle_audio_data(context, payload_msg)
+                elif isinstance(payload_msg, dict):
+                    audio_data = payload_msg.get('audio')
+                    if isinstance(audio_data, bytes):
+                        await self._handle_audio_data(context, audio_data)
+                return
+
+            message_type = response.get('message_type')
             payload_msg = response.get('payload_msg')
-            
+
             self.logger.info(f"[VOLCENGINE_PARSE] 解析响应 - 类型: {message_type}, 事件: {event}")
-            
+
             # 直接根据事件代码处理，不再区分message_type
             if event == 451:  # ASR事件
                 await self._handle_asr_response(context, payload_msg)
             elif event == 350:  # TTS配置事件
                 await self._handle_tts_response(context, payload_msg)
-            elif event == 352:  # TTS音频数据事件（重要！）
-                if isinstance(payload_msg, bytes):
-                    await self._handle_audio_data(context, payload_msg)
-                elif isinstance(payload_msg, dict) and 'audio' in payload_msg:
-                    audio_data = payload_msg['audio']
-                    if isinstance(audio_data, bytes):
-                        await self._handle_audio_data(context, audio_data)
             elif event == 150:  # 会话开始事件
                 self.logger.info(f"[VOLCENGINE_PARSE] 会话开始: {payload_msg}")
                 await self._handle_session_started(context, payload_msg)
             elif event == 152:  # 会话结束事件
                 self.logger.info(f"[VOLCENGINE_PARSE] 收到会话结束事件")
-                self._handle_chat_session_end(context)  # 结束时输出缓冲区内容
+                self._flush_chat_buffer(context)  # 结束时输出缓冲区内容
             elif event == 153:  # 对话结束事件
                 self.logger.info(f"[VOLCENGINE_PARSE] 收到对话结束事件")
-                self._handle_chat_session_end(context)  # 结束时输出缓冲区内容
+                self._flush_chat_buffer(context)  # 结束时输出缓冲区内容
             elif event == 450:  # ASR信息事件（用于打断功能）
                 self.logger.info(f"[VOLCENGINE_PARSE] ASR信息事件: {payload_msg}")
             elif event == 550:  # 聊天响应事件
@@ -1002,7 +1022,6 @@ class HandlerVolcEngineRealtime(HandlerBase, ABC):
                                 'type': 'asr_result',
                                 'text': text,
                                 'confidence': confidence,
-                                'timestamp': time.time()
                             })
             
             # 记录其他信息
@@ -1042,11 +1061,6 @@ class HandlerVolcEngineRealtime(HandlerBase, ABC):
                 return
                 
             content = payload_msg.get('content', '')
-            
-            # 初始化聊天缓冲区（如果不存在）
-            if not hasattr(context, 'chat_buffer'):
-                context.chat_buffer = ""
-                context.chat_session_active = False
                 
             # 如果内容为空，标记为session开始
             if content == '':
@@ -1074,9 +1088,9 @@ class HandlerVolcEngineRealtime(HandlerBase, ABC):
             self.logger.error(f"[VOLCENGINE_CHAT] 处理聊天响应时出错: {e}")
     
     def _flush_chat_buffer(self, context: VolcEngineRealtimeContext):
-        """输出聊天缓冲区的内容"""
+        """输出聊天缓冲区的内容并结束聊天session（非活跃时缓冲区为空，仅重置状态）"""
         try:
-            if hasattr(context, 'chat_buffer') and context.chat_buffer.strip():
+            if context.chat_buffer.strip():
                 complete_message = context.chat_buffer.strip()
                 context.text_output_queue.put(complete_message)
                 self.logger.info(f"[VOLCENGINE_CHAT] 输出完整聊天消息: '{complete_message}'")
@@ -1114,12 +1128,6 @@ class HandlerVolcEngineRealtime(HandlerBase, ABC):
         except Exception as e:
             self.logger.error(f"[VOLCENGINE_SESSION] 处理会话开始事件时出错: {e}")
     
-    def _handle_chat_session_end(self, context: VolcEngineRealtimeContext):
-        """处理聊天session结束（可在会话结束事件中调用）"""
-        if hasattr(context, 'chat_session_active') and context.chat_session_active:
-            self._flush_chat_buffer(context)
-            self.logger.info(f"[VOLCENGINE_CHAT] 聊天session结束")
-    
     async def _some_method_that_needs_dialog_id(self, context: VolcEngineRealtimeContext):
         """需要使用dialog_id的方法示例"""
         if self.current_dialog_id:
@@ -1142,7 +1150,6 @@ class HandlerVolcEngineRealtime(HandlerBase, ABC):
             context.audio_output_queue.put({
                 'type': 'tts_audio',
                 'data': audio_data,
-                'timestamp': time.time(),
                 'format': 'pcm_s16le',  # 明确标记为16位有符号小端格式
                 'sample_rate': 24000,
                 'channels': 1,
@@ -1170,13 +1177,14 @@ class HandlerVolcEngineRealtime(HandlerBase, ABC):
                 # 处理不同类型的响应
                 await self._process_server_response(context, response)
                 
+            except (ConnectionClosed, ConnectionError) as e:
+                # 连接已关闭或未建立，退出循环
+                self.logger.info(f"[VOLCENGINE_RESPONSE] 连接已关闭，停止接收服务器响应: {e!r}")
+                break
             except Exception as e:
                 self.logger.error(f"[VOLCENGINE_RESPONSE] 接收服务器响应时出错: {e}")
                 import traceback
                 self.logger.error(f"[VOLCENGINE_RESPONSE] 响应处理错误堆栈: {traceback.format_exc()}")
-                # 如果是连接错误，退出循环
-                if "connection" in str(e).lower() or "websocket" in str(e).lower():
-                    break
                 # 其他错误继续尝试
                 await asyncio.sleep(0.1)
                 continue
@@ -1,5 +1,7 @@
 import asyncio
 import time
+from collections import ChainMap, OrderedDict
+from dataclasses import dataclass
 from typing import Dict, Any, Optional, Callable, List
 from loguru import logger
 from audio_processor import DialogSession, AudioConfig, AudioDeviceManager
@@ -7,6 +9,17 @@ from volcengine_client import VolcEngineRealtimeClient
 from protocol_handler import ProtocolHandler
 
 
+@dataclass(slots=True)
+class SessionEntry:
+    """单个会话的全部状态，同一session_id的字段总是一起访问"""
+    session: DialogSession
+    client: VolcEngineRealtimeClient
+    protocol_handler: ProtocolHandler
+    audio_manager: AudioDeviceManager
+    state: str  # 'idle', 'connecting', 'active', 'closing'
+    last_activity: float
+
+
 class SessionManager:
     """会话管理器，基于官方示例的DialogSession实现"""
     
@@ -18,14 +31,8 @@ class SessionManager:
             config: 会话配置
         """
         self.config = config
-        self.sessions: Dict[str, DialogSession] = {}
-        self.clients: Dict[str, VolcEngineRealtimeClient] = {}
-        self.protocol_handlers: Dict[str, ProtocolHandler] = {}
-        self.audio_managers: Dict[str, AudioDeviceManager] = {}
-        
-        # 会话状态跟踪
-        self.session_states: Dict[str, str] = {}  # 'idle', 'connecting', 'active', 'closing'
-        self.last_activity: Dict[str, float] = {}
+        # 会话状态跟踪，按last_activity从旧到新排列，活跃时移到末尾
+        self._entries: "OrderedDict[str, SessionEntry]" = OrderedDict()
         
         # 回调函数
         self.on_message_callback: Optional[Callable] = None
@@ -63,14 +70,14 @@ class SessionManager:
             bool: 创建是否成功
         """
         try:
-            if session_id in self.sessions:
+            if session_id in self._entries:
                 logger.warning(f"Session {session_id} already exists")
                 return False
             
-            # 合并配置
-            config = self.config.copy()
-            if session_config:
-                config.update(session_config)
+            # 合并配置，ChainMap只做查找视图，会话配置优先，不复制基础配置
+            config = ChainMap(session_config or {}, self.config)
+            # 交给下游组件的配置需要真实dict，没有会话配置时直接复用基础配置
+            component_config = dict(config) if session_config else self.config
             
             # 创建音频配置
             audio_config = AudioConfig(
@@ -82,27 +89,21 @@ class SessionManager:
             
             # 创建音频设备管理器
             audio_manager = AudioDeviceManager(audio_config)
-            self.audio_managers[session_id] = audio_manager
             
             # 创建协议处理器
             protocol_handler = ProtocolHandler(
                 use_compression=config.get('use_compression', True),
                 use_protobuf=config.get('use_protobuf', False)
             )
-            self.protocol_handlers[session_id] = protocol_handler
             
             # 创建客户端
-            client = VolcEngineRealtimeClient(
-                uri=config.get('websocket_url', ''),
-                headers=config.get('headers', {})
-            )
-            self.clients[session_id] = client
+            client = VolcEngineRealtimeClient(component_config, session_id.encode('utf-8'))
             
             # 创建对话会话
             session = DialogSession(
                 client=client,
                 audio_manager=audio_manager,
-                config=config
+                config=component_config
             )
             
             # 设置回调
@@ -113,9 +114,14 @@ class SessionManager:
             if self.on_error_callback:
                 session.set_error_callback(self.on_error_callback)
             
-            self.sessions[session_id] = session
-            self.session_states[session_id] = 'idle'
-            self.last_activity[session_id] = time.time()
+            self._entries[session_id] = SessionEntry(
+                session=session,
+                client=client,
+                protocol_handler=protocol_handler,
+                audio_manager=audio_manager,
+                state='idle',
+                last_activity=time.time()
+            )
             
             logger.info(f"Session {session_id} created successfully")
             return True
@@ -125,6 +131,32 @@ class SessionManager:
             await self._cleanup_session(session_id)
             return False
     
+    def _touch(self, session_id: str, entry: SessionEntry, now: float):
+        """更新会话活跃时间并移到队尾，保持_entries按活跃时间有序"""
+        entry.last_activity = now
+        self._entries.move_to_end(session_id)
+    
+    def _get_active_entry(self, session_id: str) -> Optional[SessionEntry]:
+        """
+        获取处于active状态的会话，单次字典查找
+        
+        Args:
+            session_id: 会话ID
+            
+        Returns:
+            SessionEntry: 会话条目，不存在或未激活时返回None
+        """
+        entry = self._entries.get(session_id)
+        if entry is None:
+            logger.error(f"Session {session_id} not found")
+            return None
+        
+        if entry.state != 'active':
+            logger.error(f"Session {session_id} is not active")
+            return None
+        
+        return entry
+    
     async def start_session(self, session_id: str) -> bool:
         """
         启动会话
@@ -136,29 +168,29 @@ class SessionManager:
             bool: 启动是否成功
         """
         try:
-            if session_id not in self.sessions:
+            entry = self._entries.get(session_id)
+            if entry is None:
                 logger.error(f"Session {session_id} not found")
                 return False
             
-            session = self.sessions[session_id]
-            self.session_states[session_id] = 'connecting'
+            entry.state = 'connecting'
             
             # 启动会话
-            success = await session.start()
+            success = await entry.session.start()
             
             if success:
-                self.session_states[session_id] = 'active'
-                self.last_activity[session_id] = time.time()
+                entry.state = 'active'
+                self._touch(session_id, entry, time.time())
                 logger.info(f"Session {session_id} started successfully")
             else:
-                self.session_states[session_id] = 'idle'
+                entry.state = 'idle'
                 logger.error(f"Failed to start session {session_id}")
             
             return success
             
         except Exception as e:
             logger.error(f"Error starting session {session_id}: {e}")
-            self.session_states[session_id] = 'idle'
+            entry.state = 'idle'
             return False
     
     async def stop_session(self, session_id: str) -> bool:
@@ -172,15 +204,15 @@ class SessionManager:
             bool: 停止是否成功
         """
         try:
-            if session_id not in self.sessions:
+            entry = self._entries.get(session_id)
+            if entry is None:
                 logger.warning(f"Session {session_id} not found")
                 return True
             
-            session = self.sessions[session_id]
-            self.session_states[session_id] = 'closing'
+            entry.state = 'closing'
             
             # 停止会话
-            await session.stop()
+            await entry.session.stop()
             
             # 清理资源
             await self._cleanup_session(session_id)
@@ -203,26 +235,15 @@ class SessionManager:
         Returns:
             bool: 发送是否成功
         """
-        try:
-            if session_id not in self.sessions:
-                logger.error(f"Session {session_id} not found")
-                return False
-            
-            if self.session_states.get(session_id) != 'active':
-                logger.error(f"Session {session_id} is not active")
-                return False
-            
-            session = self.sessions[session_id]
-            success = await session.send_audio(audio_data)
-            
-            if success:
-                self.last_activity[session_id] = time.time()
-            
-            return success
-            
-        except Exception as e:
-            logger.error(f"Error sending audio to session {session_id}: {e}")
+        entry = self._get_active_entry(session_id)
+        if entry is None:
             return False
+        success = await entry.session.send_audio(audio_data)
+        
+        if success:
+            self._touch(session_id, entry, time.time())
+        
+        return success
     
     async def send_text(self, session_id: str, text: str, 
                        message_type: str = 'ChatTextQuery') -> bool:
@@ -237,33 +258,22 @@ class SessionManager:
         Returns:
             bool: 发送是否成功
         """
-        try:
-            if session_id not in self.sessions:
-                logger.error(f"Session {session_id} not found")
-                return False
-            
-            if self.session_states.get(session_id) != 'active':
-                logger.error(f"Session {session_id} is not active")
-                return False
-            
-            session = self.sessions[session_id]
-            
-            if message_type == 'ChatTextQuery':
-                success = await session.send_chat_text_query(text)
-            elif message_type == 'ChatTTSText':
-                success = await session.send_chat_tts_text(text)
-            else:
-                logger.error(f"Unsupported message type: {message_type}")
-                return False
-            
-            if success:
-                self.last_activity[session_id] = time.time()
-            
-            return success
-            
-        except Exception as e:
-            logger.error(f"Error sending text to session {session_id}: {e}")
+        entry = self._get_active_entry(session_id)
+        if entry is None:
             return False
+        
+        if message_type == 'ChatTextQuery':
+            success = await entry.session.send_chat_text_query(text)
+        elif message_type == 'ChatTTSText':
+            success = await entry.session.send_chat_tts_text(text)
+        else:
+            logger.error(f"Unsupported message type: {message_type}")
+            return False
+        
+        if success:
+            self._touch(session_id, entry, time.time())
+        
+        return success
     
     async def process_audio_file(self, session_id: str, file_path: str) -> bool:
         """
@@ -276,26 +286,15 @@ class SessionManager:
         Returns:
             bool: 处理是否成功
         """
-        try:
-            if session_id not in self.sessions:
-                logger.error(f"Session {session_id} not found")
-                return False
-            
-            if self.session_states.get(session_id) != 'active':
-                logger.error(f"Session {session_id} is not active")
-                return False
-            
-            session = self.sessions[session_id]
-            success = await session.process_audio_file(file_path)
-            
-            if success:
-                self.last_activity[session_id] = time.time()
-            
-            return success
-            
-        except Exception as e:
-            logger.error(f"Error processing audio file for session {session_id}: {e}")
+        entry = self._get_active_entry(session_id)
+        if entry is None:
             return False
+        success = await entry.session.process_audio_file(file_path)
+        
+        if success:
+            self._touch(session_id, entry, time.time())
+        
+        return success
     
     async def start_microphone(self, session_id: str) -> bool:
         """
@@ -307,22 +306,17 @@ class SessionManager:
         Returns:
             bool: 启动是否成功
         """
-        try:
-            if session_id not in self.sessions:
-                logger.error(f"Session {session_id} not found")
-                return False
-            
-            session = self.sessions[session_id]
-            success = await session.start_microphone()
-            
-            if success:
-                self.last_activity[session_id] = time.time()
-            
-            return success
-            
-        except Exception as e:
-            logger.error(f"Error starting microphone for session {session_id}: {e}")
+        entry = self._entries.get(session_id)
+        if entry is None:
+            logger.error(f"Session {session_id} not found")
             return False
+        
+        success = await entry.session.start_microphone()
+        
+        if success:
+            self._touch(session_id, entry, time.time())
+        
+        return success
     
     async def stop_microphone(self, session_id: str) -> bool:
         """
@@ -334,19 +328,14 @@ class SessionManager:
         Returns:
             bool: 停止是否成功
         """
-        try:
-            if session_id not in self.sessions:
-                logger.error(f"Session {session_id} not found")
-                return False
-            
-            session = self.sessions[session_id]
-            success = await session.stop_microphone()
-            
-            return success
-            
-        except Exception as e:
-            logger.error(f"Error stopping microphone for session {session_id}: {e}")
+        entry = self._entries.get(session_id)
+        if entry is None:
+            logger.error(f"Session {session_id} not found")
             return False
+        
+        success = await entry.session.stop_microphone()
+        
+        return success
     
     def get_session_info(self, session_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -358,15 +347,19 @@ class SessionManager:
         Returns:
             Dict[str, Any]: 会话信息，如果会话不存在返回None
         """
-        if session_id not in self.sessions:
+        entry = self._entries.get(session_id)
+        if entry is None:
             return None
         
-        session = self.sessions[session_id]
-        
+        return self._entry_info(session_id, entry)
+    
+    def _entry_info(self, session_id: str, entry: SessionEntry) -> Dict[str, Any]:
+        """构造会话信息字典"""
+        session = entry.session
         return {
             'session_id': session_id,
-            'state': self.session_states.get(session_id, 'unknown'),
-            'last_activity': self.last_activity.get(session_id, 0),
+            'state': entry.state,
+            'last_activity': entry.last_activity,
             'is_connected': session.is_connected() if hasattr(session, 'is_connected') else False,
             'config': self.config
         }
@@ -378,14 +371,7 @@ class SessionManager:
         Returns:
             List[Dict[str, Any]]: 会话信息列表
         """
-        sessions_info = []
-        
-        for session_id in self.sessions:
-            info = self.get_session_info(session_id)
-            if info:
-                sessions_info.append(info)
-        
-        return sessions_info
+        return [self._entry_info(session_id, entry) for session_id, entry in self._entries.items()]
     
     async def cleanup_inactive_sessions(self, timeout: float = 300.0):
         """
@@ -397,9 +383,11 @@ class SessionManager:
         current_time = time.time()
         inactive_sessions = []
         
-        for session_id, last_activity in self.last_activity.items():
-            if (current_time - last_activity) > timeout:
-                inactive_sessions.append(session_id)
+        # 队首最久未活跃，遇到第一个未超时的会话即可停止
+        for session_id, entry in self._entries.items():
+            if (current_time - entry.last_activity) <= timeout:
+                break
+            inactive_sessions.append(session_id)
         
         for session_id in inactive_sessions:
             logger.info(f"Cleaning up inactive session: {session_id}")
@@ -415,36 +403,29 @@ class SessionManager:
         Returns:
             bool: 发送是否成功
         """
-        try:
-            if session_id not in self.protocol_handlers:
-                return False
-            
-            protocol_handler = self.protocol_handlers[session_id]
-            
-            # 检查是否需要发送保活消息
-            current_time = time.time()
-            last_activity = self.last_activity.get(session_id, 0)
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return False
+        
+        protocol_handler = entry.protocol_handler
+        
+        # 检查是否需要发送保活消息
+        current_time = time.time()
+        
+        if protocol_handler.is_keepalive_needed(entry.last_activity, current_time):
+            # 创建保活消息
+            keepalive_msg = protocol_handler.create_keepalive_message()
             
-            if protocol_handler.is_keepalive_needed(last_activity, current_time):
-                # 创建保活消息
-                keepalive_msg = protocol_handler.create_keepalive_message()
-                
-                # 通过会话发送
-                if session_id in self.sessions:
-                    session = self.sessions[session_id]
-                    success = await session.send_raw_message(keepalive_msg)
-                    
-                    if success:
-                        self.last_activity[session_id] = current_time
-                        logger.debug(f"Keepalive sent for session {session_id}")
-                    
-                    return success
+            # 通过会话发送
+            success = await entry.session.send_raw_message(keepalive_msg)
             
-            return True
+            if success:
+                self._touch(session_id, entry, current_time)
+                logger.debug(f"Keepalive sent for session {session_id}")
             
-        except Exception as e:
-            logger.error(f"Error sending keepalive for session {session_id}: {e}")
-            return False
+            return success
+        
+        return True
     
     async def _cleanup_session(self, session_id: str):
         """
@@ -454,34 +435,13 @@ class SessionManager:
             session_id: 会话ID
         """
         try:
-            # 清理会话
-            if session_id in self.sessions:
-                del self.sessions[session_id]
-            
-            # 清理客户端
-            if session_id in self.clients:
-                client = self.clients[session_id]
-                if hasattr(client, 'close'):
-                    await client.close()
-                del self.clients[session_id]
-            
-            # 清理协议处理器
-            if session_id in self.protocol_handlers:
-                del self.protocol_handlers[session_id]
-            
-            # 清理音频管理器
-            if session_id in self.audio_managers:
-                audio_manager = self.audio_managers[session_id]
-                if hasattr(audio_manager, 'cleanup'):
-                    audio_manager.cleanup()
-                del self.audio_managers[session_id]
-            
-            # 清理状态
-            if session_id in self.session_states:
-                del self.session_states[session_id]
-            
-            if session_id in self.last_activity:
-                del self.last_activity[session_id]
+            entry = self._entries.pop(session_id, None)
+            if entry is not None:
+                # 清理客户端
+                await entry.client.close()
+                
+                # 清理音频管理器
+                entry.audio_manager.close()
             
             logger.debug(f"Session {session_id} resources cleaned up")
             
@@ -495,17 +455,12 @@ class SessionManager:
         logger.info("Shutting down SessionManager")
         
         # 停止所有会话
-        session_ids = list(self.sessions.keys())
+        session_ids = list(self._entries.keys())
         for session_id in session_ids:
             await self.stop_session(session_id)
         
         # 清理所有资源
-        self.sessions.clear()
-        self.clients.clear()
-        self.protocol_handlers.clear()
-        self.audio_managers.clear()
-        self.session_states.clear()
-        self.last_activity.clear()
+        self._entries.clear()
         
         logger.info("SessionManager shutdown complete")
 
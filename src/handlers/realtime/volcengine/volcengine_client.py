@@ -1,32 +1,144 @@
+import asyncio
 import websockets
 import gzip
-import json
+import struct
 
-from typing import Dict, Any
+from collections import deque
+from typing import Dict, Any, Optional, Union
 from loguru import logger
 
-from protocol_parser import generate_header, parse_response
+from protocol_parser import generate_header, parse_response, CLIENT_AUDIO_ONLY_REQUEST, NO_SERIALIZATION, \
+    GZIP, NO_COMPRESSION
+
+# orjson直接返回bytes且更快，未安装时退回标准库json
+try:
+    import orjson
+
+    def _dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj)
+except ImportError:
+    import json
+
+    def _dumps(obj: Any) -> bytes:
+        return json.dumps(obj).encode()
+
+# 发送队列积压时最多合并多少块PCM为一个音频帧，队列上限用于对生产者施加背压
+_AUDIO_BATCH_MAX_CHUNKS = 8
+_AUDIO_SEND_QUEUE_SIZE = _AUDIO_BATCH_MAX_CHUNKS * 4
+# 已解析但未被消费的服务器响应上限，队列满时暂停ws.recv
+_RECV_QUEUE_SIZE = 64
+# close时等待接收协程把ConnectionClosed交给消费者的最长时间
+_CLOSE_RECV_TIMEOUT = 1.0
+
+# 音频帧缓冲池，各客户端共用，复用已分配容量的bytearray，避免每帧重新分配
+_FRAME_BUFFER_SIZE = 8192
+_FRAME_POOL: "deque[bytearray]" = deque(maxlen=64)
+
+_UINT32 = struct.Struct(">I")
+_EVENT_AND_SESSION_ID_SIZE = struct.Struct(">II")
+
+# generate_header参数固定时结果不变，导入时生成一次
+_DEFAULT_HEADER = bytes(generate_header())
+_AUDIO_HEADER = bytes(generate_header(message_type=CLIENT_AUDIO_ONLY_REQUEST, serial_method=NO_SERIALIZATION,
+                                      compression_type=NO_COMPRESSION))
+_AUDIO_GZIP_HEADER = bytes(generate_header(message_type=CLIENT_AUDIO_ONLY_REQUEST, serial_method=NO_SERIALIZATION,
+                                           compression_type=GZIP))
+
+# 控制类消息的空载荷"{}"压缩结果固定，导入时计算一次并带上4字节长度
+_EMPTY_GZIP_PAYLOAD = gzip.compress(b"{}")
+_EMPTY_GZIP_FRAMED = _UINT32.pack(len(_EMPTY_GZIP_PAYLOAD)) + _EMPTY_GZIP_PAYLOAD
+
+
+def _frame_prefix(header: bytes, event: int, session_id_bytes: Optional[bytes] = None) -> bytes:
+    """拼接请求帧载荷之前的部分：header + event + [session_id长度 + session_id]"""
+    if session_id_bytes is None:
+        return header + _UINT32.pack(event)
+    return header + _EVENT_AND_SESSION_ID_SIZE.pack(event, len(session_id_bytes)) + session_id_bytes
+
+
+def _frame(prefix: bytes, payload: bytes) -> bytes:
+    """在帧前缀后追加载荷长度和载荷，一次拼接得到完整请求帧"""
+    return prefix + _UINT32.pack(len(payload)) + payload
+
+
+# 不带session_id的连接级控制帧内容固定
+_START_CONNECTION_FRAME = _frame_prefix(_DEFAULT_HEADER, 1) + _EMPTY_GZIP_FRAMED
+_FINISH_CONNECTION_FRAME = _frame_prefix(_DEFAULT_HEADER, 2) + _EMPTY_GZIP_FRAMED
+
+
+def _acquire_frame_buffer(size: int) -> bytearray:
+    """从缓冲池取出容量不小于size的bytearray，池为空或容量不足时新建"""
+    try:
+        buffer = _FRAME_POOL.pop()
+    except IndexError:
+        return bytearray(max(size, _FRAME_BUFFER_SIZE))
+    if len(buffer) < size:
+        return bytearray(size)
+    return buffer
 
 
 class VolcEngineRealtimeClient:
-    def __init__(self, config: Dict[str, Any], session_id: str, output_audio_format: str = "pcm") -> None:
+    def __init__(self, config: Dict[str, Any], session_id: Union[str, bytes], output_audio_format: str = "pcm") -> None:
         logger.info(f"[VOLCENGINE_CLIENT] 初始化客户端 - session_id: {session_id}, 音频格式: {output_audio_format}")
         self.config = config
         logger.info(f"config: {config}")
         self.logid = ""
+        # 协议帧中session_id总是以bytes出现，入口处统一转换，session_id仅保留字符串形式用于日志
+        if isinstance(session_id, bytes):
+            self._sid = session_id
+            session_id = session_id.decode('utf-8')
+        else:
+            self._sid = session_id.encode('utf-8')
         self.session_id = session_id
         self.output_audio_format = output_audio_format
         self.ws = None
+        # PCM音频帧gzip压缩率接近1，默认不压缩直接发送原始数据
+        self._use_gzip_audio = config.get('compress_audio', False)
+        # 音频由后台协程从队列取出发送，积压的PCM块合并为一帧
+        self._audio_send_queue: asyncio.Queue = asyncio.Queue(maxsize=_AUDIO_SEND_QUEUE_SIZE)
+        self._audio_send_task: Optional[asyncio.Task] = None
+        self._audio_send_error: Optional[Exception] = None
+        # 服务器响应由后台协程接收解析后放入有界队列，消费慢时自然反压接收
+        self._recv_queue: asyncio.Queue = asyncio.Queue(maxsize=_RECV_QUEUE_SIZE)
+        self._recv_task: Optional[asyncio.Task] = None
+        self._recv_error: Optional[Exception] = None
+
+        # session_id在客户端生命周期内不变，预先拼好各请求的固定前缀：header + event + session_id长度 + session_id
+        audio_request_header = _AUDIO_GZIP_HEADER if self._use_gzip_audio else _AUDIO_HEADER
+        self._audio_prefix = _frame_prefix(audio_request_header, 200, self._sid)
+        self._text_query_prefix = _frame_prefix(_DEFAULT_HEADER, 501, self._sid)
+        self._tts_text_prefix = _frame_prefix(_DEFAULT_HEADER, 500, self._sid)
+        self._hello_prefix = _frame_prefix(_DEFAULT_HEADER, 300, self._sid)
+        self._finish_session_prefix = _frame_prefix(_DEFAULT_HEADER, 102, self._sid)
+        # StartSession参数在客户端生命周期内不变，输出格式在此一次性确定并生成完整帧，connect时直接发送
+        start_session_req = config.get('start_session_req')
+        self._start_session_frame: Optional[bytes] = None
+        if start_session_req is not None:
+            if output_audio_format == "pcm_s16le":
+                start_session_req["tts"]["audio_config"]["format"] = "pcm_s16le"
+            self._start_session_frame = _frame(_frame_prefix(_DEFAULT_HEADER, 100, self._sid),
+                                               gzip.compress(_dumps(start_session_req)))
+        # TTS流式文本中内容为空的start/end边界标记很常见，按(start, end)预先生成完整帧
+        self._tts_boundary_frames = {
+            (start, end): _frame(self._tts_text_prefix,
+                                 gzip.compress(_dumps({"start": start, "end": end, "content": ""})))
+            for start, end in ((True, False), (False, True), (True, True))
+        }
         logger.debug(f"[VOLCENGINE_CLIENT] 客户端配置已设置 - base_url: {config.get('base_url', 'N/A')}")
 
     async def connect(self) -> None:
         """建立WebSocket连接"""
         logger.info(f"[VOLCENGINE_CLIENT] 开始连接到服务器: {self.config['ws_connect_config']['base_url']}")
         logger.debug(f"[VOLCENGINE_CLIENT] 连接参数 - URL: {self.config['ws_connect_config']['base_url']}, Headers: {self.config['ws_connect_config']['headers']}")
+        # 协议载荷已自行gzip压缩（PCM音频不压缩），关闭permessage-deflate避免每帧重复压缩；
+        # 放大写缓冲水位，连续发送音频时减少send挂起；保活由静音音频和会话层负责，不启用库级ping
         self.ws = await websockets.connect(
             self.config['ws_connect_config']['base_url'],
             additional_headers=self.config['ws_connect_config']['headers'],
-            ping_interval=None
+            ping_interval=None,
+            compression=None,
+            max_size=2 ** 22,
+            write_limit=(2 ** 20, 2 ** 18)
         )
         # 在新版本websockets中，response_headers可能不可用，使用try-except处理
         try:
@@ -36,32 +148,25 @@ class VolcEngineRealtimeClient:
         logger.info(f"[VOLCENGINE_CLIENT] WebSocket连接已建立 - logid: {self.logid}")
 
         # StartConnection request
-        start_connection_request = bytearray(generate_header())
-        start_connection_request.extend(int(1).to_bytes(4, 'big'))
-        payload_bytes = str.encode("{}")
-        payload_bytes = gzip.compress(payload_bytes)
-        start_connection_request.extend((len(payload_bytes)).to_bytes(4, 'big'))
-        start_connection_request.extend(payload_bytes)
-        await self.ws.send(start_connection_request)
+        await self.ws.send(_START_CONNECTION_FRAME)
         response = await self.ws.recv()
         logger.info(f"[VOLCENGINE_CLIENT] StartConnection响应: {parse_response(response)}")
-        start_session_req = self.config['start_session_req']
-        if self.output_audio_format == "pcm_s16le":
-            start_session_req["tts"]["audio_config"]["format"] = "pcm_s16le"
-        request_params = start_session_req
-        payload_bytes = str.encode(json.dumps(request_params))
-        payload_bytes = gzip.compress(payload_bytes)
-        start_session_request = bytearray(generate_header())
-        start_session_request.extend(int(100).to_bytes(4, 'big'))
-        start_session_request.extend((len(self.session_id)).to_bytes(4, 'big'))
-        start_session_request.extend(str.encode(self.session_id))
-        start_session_request.extend((len(payload_bytes)).to_bytes(4, 'big'))
-        start_session_request.extend(payload_bytes)
-        
-        await self.ws.send(start_session_request)
+        if self._start_session_frame is None:
+            raise KeyError("config中缺少start_session_req，无法启动会话")
+        await self.ws.send(self._start_session_frame)
         response = await self.ws.recv()
         logger.info(f"[VOLCENGINE_CLIENT] StartSession响应: {parse_response(response)}")
 
+        # 重新连接时换用新队列，上一条连接残留的音频块和ConnectionClosed不会带入本次会话
+        if self._audio_send_task is None or self._audio_send_task.done():
+            self._audio_send_error = None
+            self._audio_send_queue = asyncio.Queue(maxsize=_AUDIO_SEND_QUEUE_SIZE)
+            self._audio_send_task = asyncio.create_task(self._audio_send_loop())
+        if self._recv_task is None or self._recv_task.done():
+            self._recv_error = None
+            self._recv_queue = asyncio.Queue(maxsize=_RECV_QUEUE_SIZE)
+            self._recv_task = asyncio.create_task(self._recv_loop())
+
     async def start_connection(self) -> None:
         """启动连接（connect方法的别名）"""
         await self.connect()
@@ -76,103 +181,164 @@ class VolcEngineRealtimeClient:
         payload = {
             "content": "你好，我是豆包，有什么可以帮助你的？",
         }
-        hello_request = bytearray(generate_header())
-        hello_request.extend(int(300).to_bytes(4, 'big'))
-        payload_bytes = str.encode(json.dumps(payload))
-        payload_bytes = gzip.compress(payload_bytes)
-        hello_request.extend((len(self.session_id)).to_bytes(4, 'big'))
-        hello_request.extend(str.encode(self.session_id))
-        hello_request.extend((len(payload_bytes)).to_bytes(4, 'big'))
-        hello_request.extend(payload_bytes)
-        await self.ws.send(hello_request)
+        payload_bytes = gzip.compress(_dumps(payload))
+        await self.flush()
+        await self.ws.send(_frame(self._hello_prefix, payload_bytes))
         
     async def send_text_query(self, content: str) -> None:
         """发送Chat Text Query消息"""
         payload = {
             "content": content,
         }
-        chat_text_query_request = bytearray(generate_header())
-        chat_text_query_request.extend(int(501).to_bytes(4, 'big'))
-        payload_bytes = str.encode(json.dumps(payload))
-        payload_bytes = gzip.compress(payload_bytes)
-        chat_text_query_request.extend((len(self.session_id)).to_bytes(4, 'big'))
-        chat_text_query_request.extend(str.encode(self.session_id))
-        chat_text_query_request.extend((len(payload_bytes)).to_bytes(4, 'big'))
-        chat_text_query_request.extend(payload_bytes)
-        await self.ws.send(chat_text_query_request)
+        payload_bytes = gzip.compress(_dumps(payload))
+        await self.flush()
+        await self.ws.send(_frame(self._text_query_prefix, payload_bytes))
 
     async def chat_tts_text(self, is_user_querying: bool, start: bool, end: bool, content: str) -> None:
+        """发送Chat TTS Text消息，用户正在提问或既无内容又非边界标记时直接返回，调用方可提前判断以省去调用"""
         if is_user_querying:
             return
-        """发送Chat TTS Text消息"""
+        if not content:
+            boundary_frame = self._tts_boundary_frames.get((start, end))
+            if boundary_frame is not None:
+                await self.flush()
+                await self.ws.send(boundary_frame)
+            return
         payload = {
             "start": start,
             "end": end,
             "content": content,
         }
-        logger.debug(f"[VOLCENGINE_CLIENT] ChatTTSText请求载荷: {payload}")
-        payload_bytes = str.encode(json.dumps(payload))
-        payload_bytes = gzip.compress(payload_bytes)
-
-        chat_tts_text_request = bytearray(generate_header())
-        chat_tts_text_request.extend(int(500).to_bytes(4, 'big'))
-        chat_tts_text_request.extend((len(self.session_id)).to_bytes(4, 'big'))
-        chat_tts_text_request.extend(str.encode(self.session_id))
-        chat_tts_text_request.extend((len(payload_bytes)).to_bytes(4, 'big'))
-        chat_tts_text_request.extend(payload_bytes)
-        await self.ws.send(chat_tts_text_request)
+        logger.opt(lazy=True).debug("[VOLCENGINE_CLIENT] ChatTTSText请求载荷: {}", lambda: payload)
+        payload_bytes = gzip.compress(_dumps(payload))
+        await self.flush()
+        await self.ws.send(_frame(self._tts_text_prefix, payload_bytes))
 
     async def send_audio_data(self, audio: bytes) -> None:
-        """发送音频数据"""
+        """发送音频数据，数据入队后由后台协程发送，上一次发送失败的异常在此抛出"""
         # logger.debug(f"[VOLCENGINE_CLIENT] 发送音频数据 - 长度: {len(audio)} 字节")
-        from protocol_parser import CLIENT_AUDIO_ONLY_REQUEST, NO_SERIALIZATION
-        task_request = bytearray(
-            generate_header(message_type=CLIENT_AUDIO_ONLY_REQUEST,
-                                     serial_method=NO_SERIALIZATION))
-        task_request.extend(int(200).to_bytes(4, 'big'))
-        task_request.extend((len(self.session_id)).to_bytes(4, 'big'))
-        task_request.extend(str.encode(self.session_id))
-        payload_bytes = gzip.compress(audio)
-        task_request.extend((len(payload_bytes)).to_bytes(4, 'big'))  # payload size(4 bytes)
-        task_request.extend(payload_bytes)
-        await self.ws.send(task_request)
+        if self._audio_send_task is None:
+            self._raise_audio_send_error()
+            raise RuntimeError("WebSocket连接未建立或已关闭，无法发送音频数据")
+        self._raise_audio_send_error()
+        await self._audio_send_queue.put(audio)
 
-    async def receive_server_response(self) -> Dict[str, Any]:
+    async def flush(self) -> None:
+        """等待已入队的音频全部发送完成，直接发送的控制帧之前都要先调用，保证线上顺序与调用顺序一致"""
+        if self._audio_send_task is not None:
+            await self._audio_send_queue.join()
+        self._raise_audio_send_error()
+
+    def _raise_audio_send_error(self) -> None:
+        if self._audio_send_error is not None:
+            error, self._audio_send_error = self._audio_send_error, None
+            raise error
+
+    def _stop_audio_send_task(self, error: Optional[Exception] = None) -> None:
+        """停止后台发送协程并丢弃未发送的音频，唤醒阻塞在flush/put上的调用方"""
+        if self._audio_send_task is None:
+            return
+        self._audio_send_task.cancel()
+        self._audio_send_task = None
+        if error is not None and self._audio_send_error is None:
+            self._audio_send_error = error
+        send_queue = self._audio_send_queue
+        while not send_queue.empty():
+            send_queue.get_nowait()
+            send_queue.task_done()
+
+    async def _audio_send_loop(self) -> None:
+        """取出队列中积压的PCM块，按到达顺序拼接成一个音频帧发送，队列无积压时逐块发送不增加延迟"""
+        send_queue = self._audio_send_queue
+        while True:
+            chunks = [await send_queue.get()]
+            while len(chunks) < _AUDIO_BATCH_MAX_CHUNKS and not send_queue.empty():
+                chunks.append(send_queue.get_nowait())
+            try:
+                payload_chunks = chunks
+                if self._use_gzip_audio:
+                    payload_chunks = [gzip.compress(chunks[0] if len(chunks) == 1 else b"".join(chunks))]
+                await self._send_audio_frame(payload_chunks)
+            except Exception as e:
+                self._audio_send_error = e
+            finally:
+                for _ in chunks:
+                    send_queue.task_done()
+
+    async def _send_audio_frame(self, chunks: list) -> None:
+        """在池化缓冲区中原地拼出音频帧：前缀 + 载荷长度 + 各块载荷，发送后归还缓冲区"""
+        prefix = self._audio_prefix
+        payload_offset = len(prefix) + _UINT32.size
+        frame_size = payload_offset + sum(len(chunk) for chunk in chunks)
+        buffer = _acquire_frame_buffer(frame_size)
         try:
-            response = await self.ws.recv()
-            data = parse_response(response)
-            return data
-        except Exception as e:
-            raise Exception(f"Failed to receive message: {e}")
+            buffer[:len(prefix)] = prefix
+            _UINT32.pack_into(buffer, len(prefix), frame_size - payload_offset)
+            offset = payload_offset
+            for chunk in chunks:
+                end = offset + len(chunk)
+                buffer[offset:end] = chunk
+                offset = end
+            # websockets在send返回前已完成掩码拷贝，缓冲区随后即可复用
+            await self.ws.send(memoryview(buffer)[:frame_size])
+        finally:
+            _FRAME_POOL.append(buffer)
+
+    async def _recv_loop(self) -> None:
+        """持续接收并解析服务器响应放入队列，队列满时put阻塞，接收速度跟随消费速度"""
+        recv_queue = self._recv_queue
+        while True:
+            try:
+                response = await self.ws.recv()
+            except Exception as e:
+                # 连接异常后停止接收，连接已不可用，发送协程随之退出；异常交给消费者
+                self._recv_error = e
+                self._stop_audio_send_task(e)
+                await recv_queue.put(e)
+                return
+            try:
+                data = parse_response(response)
+            except Exception as e:
+                data = e
+            await recv_queue.put(data)
+
+    async def receive_server_response(self) -> Dict[str, Any]:
+        """获取下一条服务器响应，连接关闭（websockets.ConnectionClosed）和解析错误以原始类型抛出"""
+        if self._recv_queue.empty() and (self._recv_task is None or self._recv_task.done()):
+            raise self._recv_error or ConnectionError("WebSocket连接未建立")
+        data = await self._recv_queue.get()
+        if isinstance(data, Exception):
+            raise data
+        return data
 
     async def finish_session(self):
-        finish_session_request = bytearray(generate_header())
-        finish_session_request.extend(int(102).to_bytes(4, 'big'))
-        payload_bytes = str.encode("{}")
-        payload_bytes = gzip.compress(payload_bytes)
-        finish_session_request.extend((len(self.session_id)).to_bytes(4, 'big'))
-        finish_session_request.extend(str.encode(self.session_id))
-        finish_session_request.extend((len(payload_bytes)).to_bytes(4, 'big'))
-        finish_session_request.extend(payload_bytes)
-        await self.ws.send(finish_session_request)
+        await self.flush()
+        await self.ws.send(self._finish_session_prefix + _EMPTY_GZIP_FRAMED)
 
     async def finish_connection(self):
-        finish_connection_request = bytearray(generate_header())
-        finish_connection_request.extend(int(2).to_bytes(4, 'big'))
-        payload_bytes = str.encode("{}")
-        payload_bytes = gzip.compress(payload_bytes)
-        finish_connection_request.extend((len(payload_bytes)).to_bytes(4, 'big'))
-        finish_connection_request.extend(payload_bytes)
-        await self.ws.send(finish_connection_request)
-        response = await self.ws.recv()
-        logger.info(f"[VOLCENGINE_CLIENT] FinishConnection响应: {parse_response(response)}")
+        await self.flush()
+        await self.ws.send(_FINISH_CONNECTION_FRAME)
+        response = await self.receive_server_response()
+        logger.info(f"[VOLCENGINE_CLIENT] FinishConnection响应: {response}")
 
     async def close(self) -> None:
         """关闭WebSocket连接"""
         logger.info(f"[VOLCENGINE_CLIENT] 关闭WebSocket连接 - session_id: {self.session_id}")
+        self._stop_audio_send_task()
         if self.ws:
             logger.info(f"[VOLCENGINE_CLIENT] 正在关闭WebSocket连接...")
+            # 先关闭连接，挂起的ws.recv随之抛出ConnectionClosed，由接收协程放入队列交给等待中的消费者
             await self.ws.close()
+        recv_task, self._recv_task = self._recv_task, None
+        if recv_task is not None:
+            done, _ = await asyncio.wait({recv_task}, timeout=_CLOSE_RECV_TIMEOUT)
+            if not done:
+                recv_task.cancel()
+            if self._recv_error is None:
+                # 接收协程未能自行结束（如队列已满阻塞在put），补一个连接关闭标记，避免消费者永久等待
+                self._recv_error = ConnectionError("WebSocket连接已关闭")
+                if not self._recv_queue.full():
+                    self._recv_queue.put_nowait(self._recv_error)
 
     # 兼容性方法，保持与现有代码的接口一致
     async def disconnect(self) -> None:
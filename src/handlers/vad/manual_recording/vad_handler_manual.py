@@ -33,8 +33,17 @@ class ManualRecordingContext(HandlerContext):
         self.config: Optional[ManualRecordingConfigModel] = None
         self.recording_start_time: Optional[float] = None
         self.is_recording: bool = False
-        self.audio_buffer: list = []
+        # 录音开始时按最大录音时长预分配，write_idx为已写入的采样数
+        self.audio_buffer: Optional[np.ndarray] = None
+        self.write_idx: int = 0
+        # 录音开始时按采样率换算好的时长上下限（采样数）
+        self.recording_sample_rate: int = 16000
+        self.min_samples: int = 0
+        self.max_samples: int = 0
         self.slice_context: Optional[SliceContext] = None
+        # 会话内不变的输入采样率与输出定义，首次使用时缓存
+        self.input_sample_rate: Optional[int] = None
+        self.output_definition: Optional[DataBundleDefinition] = None
         self.speech_id: int = 0
 
 
@@ -102,7 +111,6 @@ class HandlerManualRecording(HandlerBase, ABC):
                output_definitions: Dict[ChatDataType, HandlerDataInfo]):
         """处理音频数据"""
         context = cast(ManualRecordingContext, context)
-        output_definition = output_definitions.get(ChatDataType.HUMAN_AUDIO).definition
         
         if not context.config.enabled:
             return
@@ -114,24 +122,32 @@ class HandlerManualRecording(HandlerBase, ABC):
         if audio is None:
             return
         
-        audio_entry = inputs.data.get_main_definition_entry()
-        sample_rate = audio_entry.sample_rate
-        audio = audio.squeeze()
+        # 单声道输入展平为一维视图
+        audio = audio.reshape(-1)
+        
+        # 录音控制信号只随状态切换后的第一帧下发，录音中的普通帧直接收集
+        if context.is_recording and not inputs.data.metadata:
+            self._collect_audio(context, audio)
+            return
         
         timestamp = None
         if inputs.is_timestamp_valid():
             timestamp = inputs.timestamp
         
-        if audio.dtype != np.float32:
-            audio = audio.astype(np.float32) / 32767
-        
         # 检查是否有录音控制信号
         recording_signal = inputs.data.get_meta('recording_signal')
         if recording_signal == 'start':
-            # 开始录音
+            # 开始录音，输入采样率在会话内不变，首次录音时解析并缓存
+            if context.input_sample_rate is None:
+                context.input_sample_rate = inputs.data.get_main_definition_entry().sample_rate
+            sample_rate = context.input_sample_rate
             context.is_recording = True
             context.recording_start_time = timestamp[0] if timestamp else 0
-            context.audio_buffer = []
+            context.recording_sample_rate = sample_rate
+            context.min_samples = int(context.config.min_recording_duration_ms * sample_rate / 1000)
+            context.max_samples = int(context.config.max_recording_duration_ms * sample_rate / 1000)
+            context.audio_buffer = np.empty(context.max_samples, dtype=np.float32)
+            context.write_idx = 0
             context.speech_id += 1
             logger.info(f"Manual recording started, speech_id: {context.speech_id}")
         
@@ -139,19 +155,19 @@ class HandlerManualRecording(HandlerBase, ABC):
             # 停止录音
             if context.is_recording:
                 context.is_recording = False
-                recording_duration = 0
-                if context.recording_start_time and timestamp:
-                    recording_duration = (timestamp[0] - context.recording_start_time) / sample_rate * 1000
+                recording_duration = context.write_idx * 1000 / context.recording_sample_rate
                 
                 # 检查录音时长
-                if recording_duration >= context.config.min_recording_duration_ms:
+                if context.write_idx >= context.min_samples:
                     # 合并录音数据
-                    if context.audio_buffer:
-                        combined_audio = np.concatenate(context.audio_buffer)
+                    if context.write_idx > 0:
+                        combined_audio = context.audio_buffer[:context.write_idx]
                         
-                        # 创建输出数据
-                        output = DataBundle(output_definition)
-                        output.set_main_data(np.expand_dims(combined_audio, axis=0))
+                        # 创建输出数据，输出定义在会话内不变，首次输出时解析并缓存
+                        if context.output_definition is None:
+                            context.output_definition = output_definitions[ChatDataType.HUMAN_AUDIO].definition
+                        output = DataBundle(context.output_definition)
+                        output.set_main_data(combined_audio[None, :])
                         output.add_meta("human_speech_end", True)
                         output.add_meta("speech_id", f"manual-speech-{context.session_id}-{context.speech_id}")
                         output.add_meta("recording_duration_ms", recording_duration)
@@ -170,20 +186,34 @@ class HandlerManualRecording(HandlerBase, ABC):
                 else:
                     logger.info(f"Recording too short ({recording_duration:.1f}ms), ignored")
                 
-                # 清空缓冲区
-                context.audio_buffer = []
+                # 清空缓冲区，已输出的数据是该缓冲区的视图，下次录音重新分配
+                context.audio_buffer = None
+                context.write_idx = 0
         
         # 如果正在录音，收集音频数据
         if context.is_recording:
-            context.audio_buffer.append(audio)
-            
-            # 检查是否超过最大录音时长
-            if context.recording_start_time and timestamp:
-                recording_duration = (timestamp[0] - context.recording_start_time) / sample_rate * 1000
-                if recording_duration > context.config.max_recording_duration_ms:
-                    logger.warning(f"Recording exceeded max duration ({recording_duration:.1f}ms), auto-stopping")
-                    context.is_recording = False
-                    context.audio_buffer = []
+            self._collect_audio(context, audio)
+    
+    @staticmethod
+    def _collect_audio(context: ManualRecordingContext, audio: np.ndarray):
+        """将音频帧写入预分配的录音缓冲区"""
+        n = audio.shape[0]
+        end_idx = context.write_idx + n
+        if end_idx > context.max_samples:
+            # 预分配缓冲区已满，即已达到最大录音时长
+            logger.warning(f"Recording exceeded max duration ({context.config.max_recording_duration_ms}ms), "
+                           f"auto-stopping")
+            context.is_recording = False
+            context.audio_buffer = None
+            context.write_idx = 0
+            return
+        dst = context.audio_buffer[context.write_idx:end_idx]
+        if audio.dtype == np.float32:
+            dst[...] = audio
+        else:
+            # int16乘以倒数后直接写入录音缓冲区，转换与拷贝合并为一次遍历
+            np.multiply(audio, np.float32(1.0 / 32768.0), out=dst, dtype=np.float32)
+        context.write_idx = end_idx
     
     def destroy_context(self, context: HandlerContext):
         """销毁上下文"""
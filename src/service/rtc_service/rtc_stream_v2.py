@@ -1,8 +1,8 @@
 import asyncio
-import json
 import uuid
 import weakref
-from typing import Optional, Dict
+from collections import deque
+from typing import Optional
 
 import numpy as np
 # noinspection PyPackageRequirements
@@ -21,6 +21,28 @@ vpx.DEFAULT_BITRATE = 5000000
 vpx.MIN_BITRATE = 1000000
 vpx.MAX_BITRATE = 10000000
 
+# 数据通道消息优先使用orjson编解码，未安装时退回标准库json
+try:
+    import orjson
+
+    _loads = orjson.loads
+
+    def _dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+except ImportError:
+    import json
+
+    _loads = json.loads
+    _dumps = json.dumps
+
+# 取不到数据时的让出间隔（秒）。get_data默认带0.1秒超时等待，正常返回None时已经让出过事件循环；
+# 只有对应通道队列不存在、get_data不等待直接返回None时，这里的sleep才起作用，避免空转占满事件循环
+_IDLE_YIELD_INTERVAL = 0.001
+
+# 聊天文本合并发送：等待后续片段的超时时间（秒）与单次合并的最大片段数
+_CHAT_BATCH_WAIT = 0.01
+_CHAT_BATCH_MAX_ITEMS = 32
+
 
 class RtcStreamV2(AsyncAudioVideoStreamHandler):
     """支持手动录音控制的RTC流处理器"""
@@ -59,12 +81,18 @@ class RtcStreamV2(AsyncAudioVideoStreamHandler):
 
         self.start_time = None
         self.timestamp_base = self.input_sample_rate
+        # 会话时间戳以输入采样率为基准，启动延迟预先换算为时间戳刻度，逐帧比较时免去除法
+        self._start_delay_ticks = self.stream_start_delay * self.timestamp_base
 
-        self.streams: Dict[str, RtcStreamV2] = {}
+        # 弱引用保存子流，会话异常退出未调用close时也能被GC回收
+        self.streams: weakref.WeakValueDictionary[str, RtcStreamV2] = weakref.WeakValueDictionary()
         
         # 手动录音控制状态
         self.is_recording = False
         self.recording_start_time = None
+        # 待随音频帧下发的录音控制信号，按收到顺序排队，每帧带出一个，
+        # 两帧之间的start/stop或stop/start切换不会因只比较当前状态而丢失
+        self._pending_recording_signals: deque[str] = deque()
 
     # copy is used as create_instance in fastrtc
     def copy(self, **kwargs) -> AsyncAudioVideoStreamHandler:
@@ -107,9 +135,12 @@ class RtcStreamV2(AsyncAudioVideoStreamHandler):
             while not self.quit.is_set():
                 chat_data = await self.client_session_delegate.get_data(EngineChannelType.AUDIO)
                 if chat_data is None or chat_data.data is None:
+                    # 仅在队列不存在、get_data未等待就返回时起作用，见_IDLE_YIELD_INTERVAL
+                    await asyncio.sleep(_IDLE_YIELD_INTERVAL)
                     continue
                 audio_array = chat_data.data.get_main_data()
                 if audio_array is None:
+                    await asyncio.sleep(_IDLE_YIELD_INTERVAL)
                     continue
                 sample_num = audio_array.shape[-1]
                 self.emit_counter.add_property("emit_audio", sample_num / self.output_sample_rate)
@@ -126,9 +157,12 @@ class RtcStreamV2(AsyncAudioVideoStreamHandler):
             while not self.quit.is_set():
                 video_frame_data: ChatData = await self.client_session_delegate.get_data(EngineChannelType.VIDEO)
                 if video_frame_data is None or video_frame_data.data is None:
+                    # 视频空闲时按帧间隔让出，队列不存在时也不会每秒唤醒上千次
+                    await asyncio.sleep(1 / self.fps)
                     continue
                 frame_data = video_frame_data.data.get_main_data().squeeze()
                 if frame_data is None:
+                    await asyncio.sleep(1 / self.fps)
                     continue
                 return frame_data
         except Exception as e:
@@ -140,30 +174,28 @@ class RtcStreamV2(AsyncAudioVideoStreamHandler):
         if self.client_session_delegate is None:
             return
         timestamp = self.client_session_delegate.get_timestamp()
-        if timestamp[0] / timestamp[1] < self.stream_start_delay:
+        if timestamp[0] < self._start_delay_ticks:
             return
         _, array = frame
         
-        # 检查是否有录音控制信号
-        recording_signal = getattr(frame, 'recording_signal', None)
-        
-        # 创建数据包并添加录音控制元数据
-        data_bundle = self.client_session_delegate.input_data_definitions[EngineChannelType.AUDIO]
-        if recording_signal:
-            data_bundle.add_meta('recording_signal', recording_signal)
+        # 仅在录音状态切换后的帧上附加录音控制信号，每帧最多一个
+        meta_data = None
+        if self._pending_recording_signals:
+            meta_data = {'recording_signal': self._pending_recording_signals.popleft()}
         
         self.client_session_delegate.put_data(
             EngineChannelType.AUDIO,
             array,
             timestamp,
             self.input_sample_rate,
+            meta_data=meta_data,
         )
 
     async def video_receive(self, frame):
         if self.client_session_delegate is None:
             return
         timestamp = self.client_session_delegate.get_timestamp()
-        if timestamp[0] / timestamp[1] < self.stream_start_delay:
+        if timestamp[0] < self._start_delay_ticks:
             return
         self.client_session_delegate.put_data(
             EngineChannelType.VIDEO,
@@ -175,27 +207,56 @@ class RtcStreamV2(AsyncAudioVideoStreamHandler):
     def set_channel(self, channel):
         super().set_channel(channel)
         self.chat_channel = channel
+        # stop_chat信号的字段在会话内固定，只构造一次
+        stop_chat_signal = ChatSignal(
+            type=ChatSignalType.INTERRUPT,
+            source_type=ChatSignalSourceType.CLIENT,
+            source_name="rtc",
+        )
         
+        def send_chat(messages, chat_id, role):
+            self.chat_channel.send(_dumps({'type': 'chat', 'message': ''.join(messages),
+                                           'id': chat_id, 'role': role}))
+
         async def process_chat_history():
             role = None
             chat_id = None
             while not self.quit.is_set():
                 chat_data = await self.client_session_delegate.get_data(EngineChannelType.TEXT)
                 if chat_data is None or chat_data.data is None:
+                    # 仅在队列不存在、get_data未等待就返回时起作用，见_IDLE_YIELD_INTERVAL
+                    await asyncio.sleep(_IDLE_YIELD_INTERVAL)
                     continue
-                logger.debug(f"Got chat data {str(chat_data)}")
-                current_role = 'human' if chat_data.type == ChatDataType.HUMAN_TEXT else 'avatar'
-                chat_id = uuid.uuid4().hex if current_role != role else chat_id
-                role = current_role
-                self.chat_channel.send(json.dumps({'type': 'chat', 'message': chat_data.data.get_main_data(), 
-                                                    'id': chat_id, 'role': current_role}))  
+                # 流式文本会短时间内连续到达，合并同一角色的连续片段后一次发送
+                pending = []
+                batched = 0
+                while chat_data is not None:
+                    if chat_data.data is not None:
+                        logger.opt(lazy=True).debug("Got chat data {}", lambda: str(chat_data))
+                        current_role = 'human' if chat_data.type == ChatDataType.HUMAN_TEXT else 'avatar'
+                        if current_role != role:
+                            if pending:
+                                send_chat(pending, chat_id, role)
+                                pending = []
+                            chat_id = uuid.uuid4().hex
+                            role = current_role
+                        text = chat_data.data.get_main_data()
+                        # 主数据为空的文本片段直接跳过，避免join时抛出TypeError终止整个发送任务
+                        if text is not None:
+                            pending.append(text)
+                    batched += 1
+                    if batched >= _CHAT_BATCH_MAX_ITEMS:
+                        break
+                    chat_data = await self.client_session_delegate.get_data(EngineChannelType.TEXT,
+                                                                            timeout=_CHAT_BATCH_WAIT)
+                if pending:
+                    send_chat(pending, chat_id, role)
         asyncio.create_task(process_chat_history())
             
         @channel.on("message")
         def _(message):
-            logger.info(f"Received message Custom: {message}")
             try:
-                message = json.loads(message)
+                message = _loads(message)
             except Exception as e:
                 logger.info(e)
                 message = {}
@@ -203,63 +264,45 @@ class RtcStreamV2(AsyncAudioVideoStreamHandler):
             if self.client_session_delegate is None:
                 return
             timestamp = self.client_session_delegate.get_timestamp()
-            if timestamp[0] / timestamp[1] < self.stream_start_delay:
+            if timestamp[0] < self._start_delay_ticks:
                 return
-            logger.info(f'on_chat_datachannel: {message}')
+            logger.debug("on_chat_datachannel: {}", message)
 
             if message['type'] == 'stop_chat':
-                self.client_session_delegate.emit_signal(
-                    ChatSignal(
-                        signal_type=ChatSignalType.STOP_CHAT,
-                        source_type=ChatSignalSourceType.CLIENT,
-                        source_id=self.session_id,
-                        target_id=self.session_id,
-                        data={}
-                    )
-                )
+                self.client_session_delegate.emit_signal(stop_chat_signal)
             elif message['type'] == 'recording_control':
                 # 处理录音控制信号
-                logger.info(f"🎤 [Backend] 接收到录音控制信号: {message}")
                 control_action = message.get('action')
                 duration = message.get('duration', 'N/A')
                 
                 if control_action == 'start':
-                    logger.info(f"🎤 [Backend] 开始手动录音 - session_id: {self.session_id}")
+                    if not self.is_recording:
+                        self._pending_recording_signals.append('start')
                     self.is_recording = True
                     self.recording_start_time = timestamp[0]
-                    logger.info(f"🎤 [Backend] 录音状态已设置: is_recording={self.is_recording}, start_time={self.recording_start_time}")
+                    logger.info("recording_control action={} session={} start_time={}",
+                                control_action, self.session_id, self.recording_start_time)
                 elif control_action == 'stop':
-                    logger.info(f"🎤 [Backend] 停止手动录音 - session_id: {self.session_id}, 前端报告时长: {duration}ms")
                     if self.is_recording:
+                        self._pending_recording_signals.append('stop')
                         actual_duration = timestamp[0] - self.recording_start_time if self.recording_start_time else 0
-                        logger.info(f"🎤 [Backend] 后端计算的实际录音时长: {actual_duration}ms")
+                        logger.info("recording_control action={} session={} duration={}ms actual_duration={}",
+                                    control_action, self.session_id, duration, actual_duration)
                     else:
-                        logger.warning(f"🎤 [Backend] 警告: 收到停止信号但当前未在录音状态")
+                        logger.warning("recording_control action={} session={}: 收到停止信号但当前未在录音状态",
+                                       control_action, self.session_id)
                     
                     self.is_recording = False
                     self.recording_start_time = None
-                    logger.info(f"🎤 [Backend] 录音状态已重置: is_recording={self.is_recording}, start_time={self.recording_start_time}")
                 else:
-                    logger.warning(f"🎤 [Backend] 未知的录音控制动作: {control_action}")
+                    logger.warning("recording_control 未知的录音控制动作: {} session={}", control_action, self.session_id)
 
     def close(self):
-        logger.info(f"🔌 [Stream] 开始关闭RTC流 - session_id: {self.session_id}")
-        
         # 设置退出信号
-        logger.info(f"🔌 [Stream] 设置退出信号 - session_id: {self.session_id}")
         self.quit.set()
-        logger.info(f"🔌 [Stream] 退出信号已设置 - session_id: {self.session_id}")
-        
-        # 从流字典中移除当前会话
-        if self.session_id in self.streams:
-            logger.info(f"🔌 [Stream] 从流字典中移除会话 - session_id: {self.session_id}")
-            logger.info(f"🔌 [Stream] 移除前流字典大小: {len(self.streams)}")
-            del self.streams[self.session_id]
-            logger.info(f"🔌 [Stream] 移除后流字典大小: {len(self.streams)}")
-        else:
-            logger.warning(f"⚠️ [Stream] 警告: 会话不在流字典中 - session_id: {self.session_id}")
         
-        # 调用父类的close方法
-        logger.info(f"🔌 [Stream] 调用父类close方法 - session_id: {self.session_id}")
+        # 调用父类的close方法，流字典为弱引用，流对象释放后条目自动移除
         super().close()
-        logger.info(f"✅ [Stream] RTC流关闭完成 - session_id: {self.session_id}")
+        factory = self.weak_factory() if self.weak_factory is not None else None
+        logger.info("[Stream] RTC流已关闭 - session_id: {}, 当前流数量: {}", self.session_id,
+                    len(factory.streams) if factory is not None else 0)
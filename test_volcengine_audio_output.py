@@ -6,6 +6,8 @@
 """
 
 import asyncio
+import functools
+import math
 import sys
 import os
 import time
@@ -18,6 +20,7 @@ project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root / "src"))
 
 from handlers.realtime.volcengine.realtime_handler_volcengine import HandlerVolcEngineRealtime, VolcEngineRealtimeContext, VolcEngineRealtimeConfig
+from handlers.realtime.volcengine.audio_processor import AudioProcessor
 from chat_engine.data_models.chat_data.chat_data_model import ChatData
 from chat_engine.data_models.chat_data_type import ChatDataType
 from chat_engine.data_models.runtime_data.data_bundle import DataBundle, DataBundleDefinition, DataBundleEntry
@@ -25,6 +28,37 @@ from chat_engine.common.handler_base import HandlerDataInfo
 from chat_engine.contexts.handler_context import HandlerContext
 import numpy as np
 
+# 等待音频输出的最长时间，以及最后一个片段之后判定输出结束的空闲时间（秒）
+OUTPUT_WAIT_TIMEOUT = 10
+OUTPUT_IDLE_TIMEOUT = 1.5
+
+@functools.lru_cache(maxsize=4)
+def _load_wav_as_float32(audio_file_path: str):
+    """以内存映射方式读取16位PCM WAV，由AudioProcessor解析文件头，返回(float32音频, 采样率)
+    
+    同一进程内按路径缓存解码结果，调用方不要原地修改返回的数组
+    """
+    wav_bytes = np.memmap(audio_file_path, dtype=np.uint8, mode='r')
+    return AudioProcessor()._parse_basic_wav(wav_bytes)
+
+def _audio_stats(audio_array: np.ndarray) -> dict:
+    """计算音频片段的统计量：均值和标准差由样本和与平方和得出，避免多次遍历"""
+    flat = audio_array.reshape(-1)
+    n = flat.size
+    total = float(flat.sum(dtype=np.float64))
+    total_sq = float(np.dot(flat, flat))
+    mean = total / n if n else 0.0
+    return {
+        'count': n,
+        'sum': total,
+        'sum_sq': total_sq,
+        'min': float(flat.min()) if n else 0.0,
+        'max': float(flat.max()) if n else 0.0,
+        'mean': mean,
+        'std': math.sqrt(max(total_sq / n - mean * mean, 0.0)) if n else 0.0,
+        'clipped': int(np.count_nonzero(flat >= 0.99) + np.count_nonzero(flat <= -0.99)),
+    }
+
 async def test_volcengine_audio_output():
     """测试火山引擎音频输出质量"""
     
@@ -68,20 +102,19 @@ async def test_volcengine_audio_output():
         handler_context.volcengine_context = volcengine_context
         
         # 创建输入数据（模拟人类音频输入）
-        # 读取测试音频文件
-        with open(audio_file_path, 'rb') as f:
-            audio_bytes = f.read()
-        
-        # 转换为numpy数组（假设是16位PCM）
-        # 跳过WAV文件头（通常44字节）
-        audio_data = audio_bytes[44:]  # 跳过WAV头
-        audio_array = np.frombuffer(audio_data, dtype=np.int16)
-        audio_array = audio_array.astype(np.float32) / 32768.0  # 归一化
-        audio_array = audio_array[np.newaxis, ...]  # 添加声道维度
+        # 文件读取放到线程池执行，避免阻塞事件循环
+        loop = asyncio.get_running_loop()
+        audio_array, input_sample_rate = await loop.run_in_executor(None, _load_wav_as_float32, audio_file_path)
+        # 单声道添加声道维度，多声道(samples, channels)转置为(channels, samples)
+        if audio_array.ndim == 1:
+            audio_array = audio_array[np.newaxis, ...]
+        else:
+            audio_array = np.ascontiguousarray(audio_array.T)
+        input_channels = audio_array.shape[0]
         
         # 创建输入数据
         input_definition = DataBundleDefinition()
-        input_definition.add_entry(DataBundleEntry.create_audio_entry("human_audio", 1, 24000))
+        input_definition.add_entry(DataBundleEntry.create_audio_entry("human_audio", input_channels, input_sample_rate))
         input_data_bundle = DataBundle(definition=input_definition)
         input_data_bundle.set_main_data(audio_array)
         
@@ -104,14 +137,31 @@ async def test_volcengine_audio_output():
         
         print("开始调用 handle 方法进行音频处理...")
         
-        # 设置输出数据收集
+        # 设置输出数据收集，统计量在收到片段时计算一次
         output_audio_data = []
+        output_audio_stats = []
+        overall = {'count': 0, 'sum': 0.0, 'sum_sq': 0.0, 'clipped': 0}
+        # 最后一个音频片段到达后空闲一段时间即视为输出结束
+        output_done = asyncio.Event()
+        idle_timer = None
+        
+        def restart_idle_timer():
+            nonlocal idle_timer
+            if idle_timer is not None:
+                idle_timer.cancel()
+            idle_timer = loop.call_later(OUTPUT_IDLE_TIMEOUT, output_done.set)
         
         def collect_output_data(chat_data: ChatData):
             """收集输出数据"""
             if chat_data.type == ChatDataType.AVATAR_AUDIO:
+                audio_array = chat_data.data.get_main_data()
+                stats = _audio_stats(audio_array)
                 output_audio_data.append(chat_data)
-                print(f"收到音频输出: {chat_data.data.get_main_data().shape}")
+                output_audio_stats.append(stats)
+                for key in overall:
+                    overall[key] += stats[key]
+                print(f"收到音频输出: {audio_array.shape}")
+                loop.call_soon_threadsafe(restart_idle_timer)
         
         # 设置数据收集回调
         volcengine_context.submit_data = collect_output_data
@@ -119,54 +169,82 @@ async def test_volcengine_audio_output():
         # 调用handle方法
         await handler.handle(handler_context, input_chat_data, output_definitions)
         
-        # 等待一段时间让异步处理完成
+        # 等待音频输出结束，最多等待OUTPUT_WAIT_TIMEOUT秒
         print("等待音频处理完成...")
-        await asyncio.sleep(10)  # 等待10秒
+        try:
+            await asyncio.wait_for(output_done.wait(), timeout=OUTPUT_WAIT_TIMEOUT)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            if idle_timer is not None:
+                idle_timer.cancel()
         
         # 检查输出结果
         if output_audio_data:
-            print(f"\n=== 音频输出测试结果 ===")
-            print(f"收到 {len(output_audio_data)} 个音频输出")
+            # 报告先拼接到列表中，最后一次性写出，避免每行一次print
+            report = ["\n=== 音频输出测试结果 ===", f"收到 {len(output_audio_data)} 个音频输出"]
+            
+            # 按最大片段长度预分配PCM导出用的缓冲区
+            max_samples = max(stats['count'] for stats in output_audio_stats)
+            pcm_scratch_f32 = np.empty(max_samples, dtype=np.float32)
+            pcm_out_i16 = np.empty(max_samples, dtype=np.int16)
             
-            for i, audio_data in enumerate(output_audio_data):
+            for i, (audio_data, stats) in enumerate(zip(output_audio_data, output_audio_stats)):
                 audio_array = audio_data.data.get_main_data()
-                print(f"\n音频片段 {i+1}:")
-                print(f"  形状: {audio_array.shape}")
-                print(f"  数据类型: {audio_array.dtype}")
-                print(f"  数值范围: [{audio_array.min():.6f}, {audio_array.max():.6f}]")
-                print(f"  均值: {audio_array.mean():.6f}")
-                print(f"  标准差: {audio_array.std():.6f}")
                 
                 # 保存为PCM文件用于播放测试
                 timestamp = int(time.time() * 1000)
                 pcm_file = f"volcengine_output_{i+1}_{timestamp}.pcm"
                 
-                # 转换回16位PCM用于播放
-                audio_16bit = (audio_array * 32767).astype(np.int16)
-                with open(pcm_file, 'wb') as f:
-                    f.write(audio_16bit.tobytes())
-                
-                print(f"  已保存PCM文件: {pcm_file}")
-                print(f"  播放命令: ffplay -f s16le -ar 24000 -ac 1 {pcm_file}")
+                # 转换回16位PCM用于播放，缩放、取整在复用缓冲区中原地完成
+                n = audio_array.size
+                scratch_f32 = pcm_scratch_f32[:n]
+                out_i16 = pcm_out_i16[:n]
+                np.multiply(audio_array.reshape(-1), np.float32(32767.0), out=scratch_f32)
+                np.rint(scratch_f32, out=scratch_f32)
+                np.copyto(out_i16, scratch_f32, casting='unsafe')
+                with open(pcm_file, 'wb', buffering=1 << 20) as f:
+                    out_i16.tofile(f)
                 
                 # 简单的噪音检测
                 # 检查是否有异常的高频噪音或静音
-                if audio_array.std() < 0.001:
-                    print(f"  ⚠️  警告: 音频可能过于安静或为静音")
-                elif audio_array.std() > 0.5:
-                    print(f"  ⚠️  警告: 音频可能包含噪音或过于响亮")
+                if stats['std'] < 0.001:
+                    dynamic_range = "  ⚠️  警告: 音频可能过于安静或为静音"
+                elif stats['std'] > 0.5:
+                    dynamic_range = "  ⚠️  警告: 音频可能包含噪音或过于响亮"
                 else:
-                    print(f"  ✅ 音频动态范围正常")
+                    dynamic_range = "  ✅ 音频动态范围正常"
                 
                 # 检查削波
-                clipped_samples = np.sum(np.abs(audio_array) >= 0.99)
+                clipped_samples = stats['clipped']
                 if clipped_samples > 0:
-                    print(f"  ⚠️  警告: 检测到 {clipped_samples} 个削波样本")
+                    clipping = f"  ⚠️  警告: 检测到 {clipped_samples} 个削波样本"
                 else:
-                    print(f"  ✅ 无削波现象")
+                    clipping = "  ✅ 无削波现象"
+                
+                report.append(
+                    f"\n音频片段 {i+1}:\n"
+                    f"  形状: {audio_array.shape}\n"
+                    f"  数据类型: {audio_array.dtype}\n"
+                    f"  数值范围: [{stats['min']:.6f}, {stats['max']:.6f}]\n"
+                    f"  均值: {stats['mean']:.6f}\n"
+                    f"  标准差: {stats['std']:.6f}\n"
+                    f"  已保存PCM文件: {pcm_file}\n"
+                    f"  播放命令: ffplay -f s16le -ar 24000 -ac 1 {pcm_file}\n"
+                    f"{dynamic_range}\n"
+                    f"{clipping}"
+                )
+            
+            if overall['count']:
+                overall_mean = overall['sum'] / overall['count']
+                overall_std = math.sqrt(max(overall['sum_sq'] / overall['count'] - overall_mean * overall_mean, 0.0))
+                report.append(f"\n全部片段: 样本数 {overall['count']}, 均值 {overall_mean:.6f}, "
+                              f"标准差 {overall_std:.6f}, 削波样本 {overall['clipped']}")
             
-            print(f"\n=== 测试完成 ===")
-            print(f"请使用 ffplay 命令播放生成的PCM文件来验证音频质量")
+            report.append("\n=== 测试完成 ===")
+            report.append("请使用 ffplay 命令播放生成的PCM文件来验证音频质量")
+            sys.stdout.write("\n".join(report) + "\n")
+            sys.stdout.flush()
             
         else:
             print("❌ 未收到任何音频输出")
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+"""
+火山引擎处理器测试的pytest配置
+
+把处理器源码目录追加到Python路径(只作用于本目录下的测试)，
+测试模块用普通import即可复用sys.modules中的缓存。
+protocol_handler / volcengine_client 以顶层模块方式导入 protocol_parser，
+因此直接按模块名导入，不走 src.handlers.realtime.volcengine 包，
+避免包的 __init__ 拉起完整的实时处理器依赖。
+追加到末尾而不是插到最前，不遮蔽同名的已安装模块。
+"""
+
+import os
+import sys
+
+_VOLCENGINE_DIR = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), '..', '..', '..', '..', '..', 'src', 'handlers', 'realtime', 'volcengine'))
+
+if _VOLCENGINE_DIR not in sys.path:
+    sys.path.append(_VOLCENGINE_DIR)
@@ -15,6 +15,7 @@ import unittest
 import numpy as np
 import io
 import struct
+import tempfile
 import importlib.util
 from unittest.mock import Mock, patch, MagicMock
 
@@ -34,14 +35,27 @@ AudioProcessor = audio_processor.AudioProcessor
 class TestAudioProcessor(unittest.TestCase):
     """AudioProcessor测试类"""
     
-    def setUp(self):
-        """测试前的设置"""
-        self.processor = AudioProcessor(
+    @classmethod
+    def setUpClass(cls):
+        """整个测试类共用一个处理器，窗函数和缓冲区只初始化一次"""
+        cls._shared_processor = AudioProcessor(
             target_sample_rate=16000,
             target_channels=1,
             chunk_size=1024,
             overlap_size=256
         )
+        # 固定种子直接生成float32随机音频，各测试取其前N个样本的视图
+        cls._audio_pool = np.random.default_rng(0).random(200000, dtype=np.float32)
+        cls._audio_pool.flags.writeable = False
+        
+    def _random_audio(self, num_samples):
+        """返回num_samples个[0, 1)范围的随机样本（共享数据的只读视图）"""
+        return self._audio_pool[:num_samples]
+        
+    def setUp(self):
+        """测试前的设置"""
+        self.processor = self._shared_processor
+        self.processor.reset_buffer()
         
     def test_initialization(self):
         """测试初始化"""
@@ -113,7 +127,7 @@ class TestAudioProcessor(unittest.TestCase):
     def test_add_to_buffer_single_chunk(self):
         """测试添加单个音频块到缓冲区"""
         # 创建一个完整的chunk大小的音频数据
-        audio_chunk = np.random.rand(1024).astype(np.float32)
+        audio_chunk = self._random_audio(1024)
         
         processed_chunks = self.processor.add_to_buffer(audio_chunk)
         
@@ -125,7 +139,7 @@ class TestAudioProcessor(unittest.TestCase):
     def test_add_to_buffer_multiple_chunks(self):
         """测试添加多个音频块到缓冲区"""
         # 创建大于chunk_size的音频数据
-        large_audio = np.random.rand(2500).astype(np.float32)
+        large_audio = self._random_audio(2500)
         
         processed_chunks = self.processor.add_to_buffer(large_audio)
         
@@ -138,7 +152,7 @@ class TestAudioProcessor(unittest.TestCase):
     def test_add_to_buffer_small_chunk(self):
         """测试添加小音频块到缓冲区"""
         # 创建小于chunk_size的音频数据
-        small_audio = np.random.rand(500).astype(np.float32)
+        small_audio = self._random_audio(500)
         
         processed_chunks = self.processor.add_to_buffer(small_audio)
         
@@ -149,7 +163,7 @@ class TestAudioProcessor(unittest.TestCase):
     def test_flush_buffer_with_data(self):
         """测试刷新包含数据的缓冲区"""
         # 添加一些数据到缓冲区
-        small_audio = np.random.rand(500).astype(np.float32)
+        small_audio = self._random_audio(500)
         self.processor.add_to_buffer(small_audio)
         
         # 刷新缓冲区
@@ -173,7 +187,7 @@ class TestAudioProcessor(unittest.TestCase):
     def test_reset_buffer(self):
         """测试重置缓冲区"""
         # 添加一些数据到缓冲区
-        audio_data = np.random.rand(500).astype(np.float32)
+        audio_data = self._random_audio(500)
         self.processor.add_to_buffer(audio_data)
         self.processor.processed_samples = 1000
         
@@ -276,7 +290,7 @@ class TestAudioProcessor(unittest.TestCase):
     def test_get_audio_info(self):
         """测试获取音频信息"""
         # 创建测试音频数据
-        audio_data = np.random.rand(16000).astype(np.float32)  # 1秒的16kHz音频
+        audio_data = self._random_audio(16000)  # 1秒的16kHz音频
         sample_rate = 16000
         
         info = self.processor.get_audio_info(audio_data, sample_rate)
@@ -296,7 +310,7 @@ class TestAudioProcessor(unittest.TestCase):
     def test_buffer_overlap_processing(self):
         """测试缓冲区重叠处理"""
         # 创建足够大的音频数据来测试重叠
-        audio_data = np.random.rand(2048).astype(np.float32)
+        audio_data = self._random_audio(2048)
         
         processed_chunks = self.processor.add_to_buffer(audio_data)
         
@@ -320,7 +334,7 @@ class TestAudioProcessor(unittest.TestCase):
         """测试不同采样率的处理"""
         # 测试8kHz处理器
         processor_8k = AudioProcessor(target_sample_rate=8000)
-        audio_data = np.random.rand(1000).astype(np.float32)
+        audio_data = self._random_audio(1000)
         
         processed = processor_8k.process_audio(audio_data, 8000)
         
@@ -331,7 +345,7 @@ class TestAudioProcessor(unittest.TestCase):
     def test_large_audio_processing(self):
         """测试大音频数据处理"""
         # 创建大音频数据 (10秒的16kHz音频)
-        large_audio = np.random.rand(160000).astype(np.float32)
+        large_audio = self._random_audio(160000)
         
         processed = self.processor.process_audio(large_audio, 16000)
         
@@ -340,6 +354,120 @@ class TestAudioProcessor(unittest.TestCase):
         self.assertEqual(len(processed), len(large_audio))
 
 
+def _build_wav(pcm: bytes, channels: int = 1, sample_rate: int = 16000, bit_depth: int = 16,
+               audio_format: int = 1, chunks_before_data: bytes = b'', data_size: int = None) -> bytes:
+    """构造WAV字节流: RIFF头 + fmt块 + 可选的其他块 + data块，data_size可声明为与实际数据不符"""
+    block_align = channels * bit_depth // 8
+    fmt = struct.pack('<HHIIHH', audio_format, channels, sample_rate, sample_rate * block_align,
+                      block_align, bit_depth)
+    body = (b'WAVE' + b'fmt ' + struct.pack('<I', len(fmt)) + fmt + chunks_before_data
+            + b'data' + struct.pack('<I', len(pcm) if data_size is None else data_size) + pcm)
+    return b'RIFF' + struct.pack('<I', len(body)) + body
+
+
+class TestWavStreaming(unittest.TestCase):
+    """测试WAV data块定位和按块流式读取"""
+    
+    def setUp(self):
+        """测试前的设置"""
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp_dir.cleanup)
+        self.pcm = struct.pack('<10h', *range(-5000, 5000, 1000))
+        
+    def _write(self, wav_bytes: bytes) -> str:
+        path = os.path.join(self._tmp_dir.name, 'test.wav')
+        with open(path, 'wb') as f:
+            f.write(wav_bytes)
+        return path
+        
+    def _stream(self, wav_bytes: bytes, chunk_size: int):
+        return [bytes(chunk) for chunk in AudioProcessor.stream_int16_from_file(self._write(wav_bytes), chunk_size)]
+        
+    def test_locate_plain_header(self):
+        """测试标准44字节头的WAV"""
+        wav_bytes = _build_wav(self.pcm, sample_rate=24000)
+        
+        located = audio_processor._locate_pcm16_wav_data(wav_bytes)
+        
+        self.assertEqual(located, (44, len(self.pcm), 1, 24000))
+        self.assertEqual(b''.join(self._stream(wav_bytes, 4)), self.pcm)
+        
+    def test_locate_after_list_chunk(self):
+        """测试data块之前有LIST块的WAV"""
+        list_chunk = b'LIST' + struct.pack('<I', 8) + b'INFOabcd'
+        wav_bytes = _build_wav(self.pcm, chunks_before_data=list_chunk)
+        
+        data_offset, data_length, _, _ = audio_processor._locate_pcm16_wav_data(wav_bytes)
+        
+        self.assertEqual(data_offset, 44 + len(list_chunk))
+        self.assertEqual(wav_bytes[data_offset:data_offset + data_length], self.pcm)
+        
+    def test_locate_after_odd_sized_chunk(self):
+        """测试奇数长度的块后跟1字节填充"""
+        odd_chunk = b'junk' + struct.pack('<I', 3) + b'xyz' + b'\x00'
+        wav_bytes = _build_wav(self.pcm, chunks_before_data=odd_chunk)
+        
+        data_offset, data_length, _, _ = audio_processor._locate_pcm16_wav_data(wav_bytes)
+        
+        self.assertEqual(data_offset, 44 + len(odd_chunk))
+        self.assertEqual(wav_bytes[data_offset:data_offset + data_length], self.pcm)
+        
+    def test_truncated_data_size(self):
+        """测试data块声明长度超过实际数据时按实际数据截断到整帧"""
+        wav_bytes = _build_wav(self.pcm + b'\x01', data_size=1000)
+        
+        _, data_length, _, _ = audio_processor._locate_pcm16_wav_data(wav_bytes)
+        
+        self.assertEqual(data_length, len(self.pcm))
+        self.assertEqual(b''.join(self._stream(wav_bytes, 4)), self.pcm)
+        
+    def test_missing_data_chunk(self):
+        """测试没有data块的WAV抛出ValueError"""
+        wav_bytes = _build_wav(b'')[:-8] + b'LIST' + struct.pack('<I', 0)
+        
+        with self.assertRaises(ValueError):
+            audio_processor._locate_pcm16_wav_data(wav_bytes)
+        
+    def test_stream_chunks_outlive_generator(self):
+        """测试生成器结束、文件映射关闭后，已产出的块仍可使用"""
+        path = self._write(_build_wav(self.pcm))
+        
+        chunks = list(AudioProcessor.stream_int16_from_file(path, 4))
+        
+        self.assertEqual(b''.join(chunks), self.pcm)
+        
+    def test_stream_empty_file(self):
+        """测试空文件抛出ValueError"""
+        path = self._write(b'')
+        
+        with self.assertRaises(ValueError):
+            list(AudioProcessor.stream_int16_from_file(path, 4))
+        
+    def test_stream_stereo_chunks(self):
+        """测试立体声按chunk_size帧切块，每块字节数为chunk_size*2*声道数"""
+        wav_bytes = _build_wav(self.pcm, channels=2)
+        
+        chunks = self._stream(wav_bytes, 2)
+        
+        self.assertEqual([len(chunk) for chunk in chunks], [8, 8, 4])
+        self.assertEqual(b''.join(chunks), self.pcm)
+        
+    def test_stream_falls_back_to_soundfile(self):
+        """测试非16位PCM文件交给soundfile转换"""
+        samples = np.array([[100, -100], [200, -200], [300, -300]], dtype=np.int16)
+        fake_sf = Mock()
+        fake_sf.read.return_value = (samples, 16000)
+        path = self._write(_build_wav(b'\x00' * 24, channels=2, bit_depth=32, audio_format=3))
+        
+        with patch.object(audio_processor, 'AUDIO_LIBS_AVAILABLE', True), \
+                patch.object(audio_processor, 'sf', fake_sf, create=True):
+            chunks = [bytes(chunk) for chunk in AudioProcessor.stream_int16_from_file(path, 2)]
+        
+        fake_sf.read.assert_called_once_with(path, dtype='int16')
+        self.assertEqual([len(chunk) for chunk in chunks], [8, 4])
+        self.assertEqual(b''.join(chunks), samples.tobytes())
+
+
 class TestAudioProcessorWithoutLibraries(unittest.TestCase):
     """测试没有音频库时的AudioProcessor功能"""
     
@@ -361,6 +489,16 @@ class TestAudioProcessorWithoutLibraries(unittest.TestCase):
         with self.assertRaises(RuntimeError):
             self.processor.load_audio_file("test.wav")
             
+    def test_stream_non_pcm16_without_libraries(self):
+        """测试没有音频库时流式读取非16位PCM文件抛出ValueError"""
+        wav_bytes = _build_wav(b'\x00' * 8, bit_depth=32, audio_format=3)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'float.wav')
+            with open(path, 'wb') as f:
+                f.write(wav_bytes)
+            with self.assertRaises(ValueError):
+                list(AudioProcessor.stream_int16_from_file(path, 4))
+            
     def test_simple_resample_fallback(self):
         """测试简单重采样回退功能"""
         audio_data = np.array([0.1, 0.2, 0.3, 0.4], dtype=np.float32)
@@ -9,33 +9,65 @@
 4. 协议头处理
 """
 
-import sys
-import os
 import unittest
 import struct
 import json
 import numpy as np
-import importlib.util
-from unittest.mock import Mock, patch, MagicMock
 
-# 添加项目根目录到Python路径
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', '..', '..')))
+# 项目路径由同目录的 conftest.py 统一配置
+from protocol_handler import VolcEngineProtocolHandler, MessageType, AudioFormat
 
-# 直接导入协议处理器文件，避免复杂的模块依赖
-protocol_handler_path = os.path.join(os.path.dirname(__file__), '..', '..', '..', '..', '..', 'src', 'handlers', 'realtime', 'volcengine', 'protocol_handler.py')
-spec = importlib.util.spec_from_file_location("protocol_handler", protocol_handler_path)
-protocol_handler = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(protocol_handler)
+# 16字节消息头: magic, msg_type, flags, seq_id, payload_len, req_hash
+_HEADER_STRUCT = struct.Struct('>4sBBHII')
 
-# 从模块中导入需要的类
-VolcEngineProtocolHandler = protocol_handler.VolcEngineProtocolHandler
-MessageType = protocol_handler.MessageType
-AudioFormat = protocol_handler.AudioFormat
+
+def _split(enc):
+    """零拷贝拆分编码消息，返回(消息头字段元组, 载荷memoryview)"""
+    mv = memoryview(enc)
+    return _HEADER_STRUCT.unpack_from(mv), mv[_HEADER_STRUCT.size:]
+
+# 测试用小段int16音频，模块级缓存，编码端只读取不修改
+_AUDIO_1 = np.array([1000], dtype=np.int16)
+_AUDIO_2 = np.array([1000, 2000], dtype=np.int16)
+_AUDIO_3 = np.array([1000, 2000, 3000], dtype=np.int16)
+_AUDIO_4 = np.array([1000, 2000, 3000, 4000], dtype=np.int16)
+
+# 空音频输入，模块级缓存
+_EMPTY_I16 = np.empty(0, dtype=np.int16)
+
+# 枚举成员与协议约定取值对照表
+_MSG_TYPE_EXPECTED = (
+    (MessageType.AUDIO_ONLY_SERVER_ACK, 0x11),
+    (MessageType.AUDIO_ONLY_CLIENT_REQUEST, 0x12),
+    (MessageType.FULL_CLIENT_REQUEST, 0x13),
+    (MessageType.FULL_SERVER_RESPONSE, 0x14),
+    (MessageType.ERROR_RESPONSE, 0x15),
+)
+_AUDIO_FORMAT_EXPECTED = (
+    (AudioFormat.PCM_16K_16BIT_MONO, 1),
+    (AudioFormat.PCM_24K_16BIT_MONO, 2),
+    (AudioFormat.PCM_8K_16BIT_MONO, 3),
+)
 
 
 class TestVolcEngineProtocolHandler(unittest.TestCase):
     """VolcEngineProtocolHandler测试类"""
     
+    @classmethod
+    def setUpClass(cls):
+        """类级别设置: 缓存采样率到音频格式的映射表和大音频数据"""
+        cls._FORMAT_BY_RATE = {
+            8000: AudioFormat.PCM_8K_16BIT_MONO,
+            16000: AudioFormat.PCM_16K_16BIT_MONO,
+            24000: AudioFormat.PCM_24K_16BIT_MONO,
+            # 不支持的采样率，应该默认为16kHz
+            44100: AudioFormat.PCM_16K_16BIT_MONO,
+        }
+        # 1秒16kHz随机音频，固定种子保证可复现，只读共享
+        cls._LARGE_AUDIO = np.random.default_rng(0).integers(-32768, 32767, size=16000, dtype=np.int16)
+        cls._LARGE_AUDIO.flags.writeable = False
+        cls._LARGE_AUDIO_BYTES = cls._LARGE_AUDIO.tobytes()
+
     def setUp(self):
         """测试前的设置"""
         self.handler = VolcEngineProtocolHandler(sample_rate=16000, channels=1, bit_depth=16)
@@ -50,55 +82,37 @@ class TestVolcEngineProtocolHandler(unittest.TestCase):
         
     def test_audio_format_mapping(self):
         """测试音频格式映射"""
-        # 测试8kHz
-        handler_8k = VolcEngineProtocolHandler(sample_rate=8000)
-        self.assertEqual(handler_8k.audio_format, AudioFormat.PCM_8K_16BIT_MONO)
-        
-        # 测试16kHz
-        handler_16k = VolcEngineProtocolHandler(sample_rate=16000)
-        self.assertEqual(handler_16k.audio_format, AudioFormat.PCM_16K_16BIT_MONO)
-        
-        # 测试24kHz
-        handler_24k = VolcEngineProtocolHandler(sample_rate=24000)
-        self.assertEqual(handler_24k.audio_format, AudioFormat.PCM_24K_16BIT_MONO)
-        
-        # 测试不支持的采样率，应该默认为16kHz
-        handler_unknown = VolcEngineProtocolHandler(sample_rate=44100)
-        self.assertEqual(handler_unknown.audio_format, AudioFormat.PCM_16K_16BIT_MONO)
+        for sample_rate, expected_format in self._FORMAT_BY_RATE.items():
+            with self.subTest(sample_rate=sample_rate):
+                self.assertEqual(VolcEngineProtocolHandler(sample_rate=sample_rate).audio_format, expected_format)
         
     def test_encode_audio_message(self):
         """测试音频消息编码"""
-        # 创建测试音频数据
-        audio_data = np.array([1000, 2000, 3000, 4000], dtype=np.int16)
+        expected_payload = _AUDIO_4.tobytes()
         
         # 编码音频消息
-        encoded = self.handler.encode_audio_message(audio_data, is_last=False, request_id="test-123")
+        encoded = self.handler.encode_audio_message(_AUDIO_4, is_last=False, request_id="test-123")
         
         # 验证消息结构
         self.assertGreater(len(encoded), 16)  # 至少包含16字节消息头
         
         # 验证消息头
-        header = encoded[:16]
-        magic, msg_type, flags, seq_id, payload_len, req_hash = struct.unpack('>4sBBHII', header)
+        (magic, msg_type, flags, seq_id, payload_len, req_hash), payload = _split(encoded)
         
         self.assertEqual(magic, b'VOLC')
         self.assertEqual(msg_type, MessageType.AUDIO_ONLY_CLIENT_REQUEST.value)
         self.assertEqual(flags, 0x00)  # is_last=False
-        self.assertEqual(payload_len, len(audio_data.tobytes()))
+        self.assertEqual(payload_len, len(expected_payload))
         
         # 验证载荷数据
-        payload = encoded[16:]
-        self.assertEqual(payload, audio_data.tobytes())
+        self.assertEqual(payload, memoryview(expected_payload))
         
     def test_encode_audio_message_last(self):
         """测试最后一个音频消息编码"""
-        audio_data = np.array([1000, 2000], dtype=np.int16)
-        
-        encoded = self.handler.encode_audio_message(audio_data, is_last=True, request_id="test-456")
+        encoded = self.handler.encode_audio_message(_AUDIO_2, is_last=True, request_id="test-456")
         
         # 验证is_last标志
-        header = encoded[:16]
-        _, _, flags, _, _, _ = struct.unpack('>4sBBHII', header)
+        (_, _, flags, _, _, _), _ = _split(encoded)
         self.assertEqual(flags, 0x01)  # is_last=True
         
     def test_encode_audio_message_float32_conversion(self):
@@ -108,112 +122,111 @@ class TestVolcEngineProtocolHandler(unittest.TestCase):
         
         encoded = self.handler.encode_audio_message(audio_data)
         
-        # 验证转换后的数据
-        payload = encoded[16:]
-        converted_data = np.frombuffer(payload, dtype=np.int16)
+        # 验证转换后的数据 (int16小端序，与编码端tobytes()一致)
+        _, payload = _split(encoded)
+        self.assertEqual(len(payload), 8)
+        converted_data = struct.unpack_from('<4h', payload)
         
-        # 验证转换结果
-        expected = np.array([16383, -16384, 32767, -32767], dtype=np.int16)
-        np.testing.assert_array_almost_equal(converted_data, expected, decimal=0)
+        # 验证转换结果 (允许±1的舍入误差)
+        expected = (16383, -16384, 32767, -32767)
+        self.assertTrue(
+            all(abs(c - e) <= 1 for c, e in zip(converted_data, expected)),
+            f"转换结果 {converted_data} 与期望 {expected} 相差超过1",
+        )
         
     def test_encode_full_request(self):
         """测试完整请求编码"""
-        audio_data = np.array([1000, 2000, 3000], dtype=np.int16)
         text_data = "测试文本"
         
-        encoded = self.handler.encode_full_request(audio_data, text_data, is_last=True, request_id="full-test")
+        encoded = self.handler.encode_full_request(_AUDIO_3, text_data, is_last=True, request_id="full-test")
         
         # 验证消息头
-        header = encoded[:16]
-        magic, msg_type, flags, seq_id, payload_len, req_hash = struct.unpack('>4sBBHII', header)
+        (magic, msg_type, flags, seq_id, payload_len, req_hash), payload = _split(encoded)
         
         self.assertEqual(magic, b'VOLC')
         self.assertEqual(msg_type, MessageType.FULL_CLIENT_REQUEST.value)
         self.assertEqual(flags, 0x01)  # is_last=True
         
-        # 验证JSON载荷
-        payload = encoded[16:]
-        payload_data = json.loads(payload.decode('utf-8'))
-        
-        self.assertEqual(payload_data['audio_format'], AudioFormat.PCM_16K_16BIT_MONO.value)
-        self.assertEqual(payload_data['sample_rate'], 16000)
-        self.assertEqual(payload_data['channels'], 1)
-        self.assertEqual(payload_data['text_data'], text_data)
-        self.assertEqual(payload_data['is_last'], True)
-        self.assertIn('audio_data', payload_data)
+        # 验证JSON载荷: 直接在字节层面检查字段，避免完整解析
+        # 字段片段用json.dumps生成，与编码端的转义规则保持一致
+        payload = bytes(payload)
+        for key, value in (
+            ('audio_format', AudioFormat.PCM_16K_16BIT_MONO.value),
+            ('sample_rate', 16000),
+            ('channels', 1),
+            ('text_data', text_data),
+            ('is_last', True),
+        ):
+            with self.subTest(key=key):
+                self.assertIn(json.dumps({key: value})[1:-1].encode('utf-8'), payload)
+        self.assertIn(b'"audio_data"', payload)
+        
+    def test_encode_full_request_json_roundtrip(self):
+        """测试完整请求载荷为合法JSON"""
+        encoded = self.handler.encode_full_request(_AUDIO_3, "测试文本", is_last=True, request_id="full-test")
+        
+        _, payload = _split(encoded)
+        payload_data = json.loads(str(payload, 'utf-8'))
+        self.assertEqual(payload_data['text_data'], "测试文本")
         
     def test_sequence_id_increment(self):
         """测试序列号递增"""
-        audio_data = np.array([1000], dtype=np.int16)
-        
         # 发送多个消息，验证序列号递增
-        encoded1 = self.handler.encode_audio_message(audio_data)
-        encoded2 = self.handler.encode_audio_message(audio_data)
-        encoded3 = self.handler.encode_audio_message(audio_data)
+        encoded1 = self.handler.encode_audio_message(_AUDIO_1)
+        encoded2 = self.handler.encode_audio_message(_AUDIO_1)
+        encoded3 = self.handler.encode_audio_message(_AUDIO_1)
         
-        # 提取序列号
-        _, _, _, seq1, _, _ = struct.unpack('>4sBBHII', encoded1[:16])
-        _, _, _, seq2, _, _ = struct.unpack('>4sBBHII', encoded2[:16])
-        _, _, _, seq3, _, _ = struct.unpack('>4sBBHII', encoded3[:16])
+        # 拼接三个消息头后一次性批量解析，提取序列号
+        headers = b''.join(memoryview(e)[:_HEADER_STRUCT.size] for e in (encoded1, encoded2, encoded3))
+        seqs = tuple(fields[3] for fields in _HEADER_STRUCT.iter_unpack(headers))
         
-        self.assertEqual(seq1, 1)
-        self.assertEqual(seq2, 2)
-        self.assertEqual(seq3, 3)
+        self.assertEqual(seqs, (1, 2, 3))
         
     def test_sequence_id_wraparound(self):
         """测试序列号循环"""
         # 设置序列号接近最大值
         self.handler.sequence_id = 65535
-        
-        audio_data = np.array([1000], dtype=np.int16)
-        encoded = self.handler.encode_audio_message(audio_data)
+        encoded = self.handler.encode_audio_message(_AUDIO_1)
         
         # 验证序列号回到0
-        _, _, _, seq_id, _, _ = struct.unpack('>4sBBHII', encoded[:16])
+        (_, _, _, seq_id, _, _), _ = _split(encoded)
         self.assertEqual(seq_id, 0)
         self.assertEqual(self.handler.sequence_id, 0)
         
     def test_message_type_values(self):
         """测试消息类型枚举值"""
-        self.assertEqual(MessageType.AUDIO_ONLY_SERVER_ACK.value, 0x11)
-        self.assertEqual(MessageType.AUDIO_ONLY_CLIENT_REQUEST.value, 0x12)
-        self.assertEqual(MessageType.FULL_CLIENT_REQUEST.value, 0x13)
-        self.assertEqual(MessageType.FULL_SERVER_RESPONSE.value, 0x14)
-        self.assertEqual(MessageType.ERROR_RESPONSE.value, 0x15)
+        for member, value in _MSG_TYPE_EXPECTED:
+            with self.subTest(member=member):
+                self.assertEqual(member.value, value)
         
     def test_audio_format_values(self):
         """测试音频格式枚举值"""
-        self.assertEqual(AudioFormat.PCM_16K_16BIT_MONO.value, 1)
-        self.assertEqual(AudioFormat.PCM_24K_16BIT_MONO.value, 2)
-        self.assertEqual(AudioFormat.PCM_8K_16BIT_MONO.value, 3)
+        for member, value in _AUDIO_FORMAT_EXPECTED:
+            with self.subTest(member=member):
+                self.assertEqual(member.value, value)
         
     def test_empty_audio_data(self):
         """测试空音频数据"""
-        audio_data = np.array([], dtype=np.int16)
-        
-        encoded = self.handler.encode_audio_message(audio_data)
+        encoded = self.handler.encode_audio_message(_EMPTY_I16)
         
         # 验证消息头
-        header = encoded[:16]
-        _, _, _, _, payload_len, _ = struct.unpack('>4sBBHII', header)
+        (_, _, _, _, payload_len, _), _ = _split(encoded)
         
         self.assertEqual(payload_len, 0)
         self.assertEqual(len(encoded), 16)  # 只有消息头
         
     def test_large_audio_data(self):
         """测试大音频数据"""
-        # 创建较大的音频数据 (1秒16kHz音频)
-        audio_data = np.random.randint(-32768, 32767, size=16000, dtype=np.int16)
-        
-        encoded = self.handler.encode_audio_message(audio_data)
+        # 使用类级别缓存的大音频数据 (1秒16kHz音频)
+        encoded = self.handler.encode_audio_message(self._LARGE_AUDIO)
         
         # 验证消息结构
-        self.assertEqual(len(encoded), 16 + len(audio_data.tobytes()))
+        self.assertEqual(len(encoded), 16 + len(self._LARGE_AUDIO_BYTES))
         
         # 验证载荷长度
-        header = encoded[:16]
-        _, _, _, _, payload_len, _ = struct.unpack('>4sBBHII', header)
-        self.assertEqual(payload_len, len(audio_data.tobytes()))
+        (_, _, _, _, payload_len, _), payload = _split(encoded)
+        self.assertEqual(payload_len, len(self._LARGE_AUDIO_BYTES))
+        self.assertEqual(payload, memoryview(self._LARGE_AUDIO_BYTES))
 
 
 if __name__ == '__main__':
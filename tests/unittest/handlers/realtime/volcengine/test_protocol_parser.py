@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+火山引擎协议解析器单元测试
+
+测试parse_response对服务器帧的解析:
+1. 同时带序列号和事件号的帧
+2. 音频事件(352)帧
+3. 截断帧的错误处理
+"""
+
+import gzip
+import json
+import struct
+import unittest
+
+# 项目路径由同目录的 conftest.py 统一配置
+from protocol_parser import (
+    generate_header, parse_response,
+    SERVER_FULL_RESPONSE, SERVER_ERROR_RESPONSE,
+    NEG_SEQUENCE, MSG_WITH_EVENT, NO_SERIALIZATION, NO_COMPRESSION,
+)
+
+_SESSION_ID = b"test-session"
+
+
+def _server_frame(body: bytes, event: int = None, seq: int = None, **header_kwargs) -> bytes:
+    """按协议顺序拼接服务器完整响应帧: header + [seq] + [event] + session_id + 载荷"""
+    flags = (NEG_SEQUENCE if seq is not None else 0) | (MSG_WITH_EVENT if event is not None else 0)
+    frame = bytes(generate_header(message_type=SERVER_FULL_RESPONSE, message_type_specific_flags=flags,
+                                  **header_kwargs))
+    if seq is not None:
+        frame += struct.pack(">I", seq)
+    if event is not None:
+        frame += struct.pack(">I", event)
+    return frame + struct.pack(">I", len(_SESSION_ID)) + _SESSION_ID + struct.pack(">I", len(body)) + body
+
+
+class TestParseResponse(unittest.TestCase):
+    """parse_response测试类"""
+
+    def test_sequence_and_event(self):
+        """测试同时带序列号和事件号时，事件号从序列号之后读取"""
+        payload = {"text": "你好"}
+        frame = _server_frame(gzip.compress(json.dumps(payload).encode()), event=350, seq=7)
+
+        result = parse_response(frame)
+
+        self.assertEqual(result['message_type'], 'SERVER_FULL_RESPONSE')
+        self.assertEqual(result['seq'], 7)
+        self.assertEqual(result['event'], 350)
+        self.assertEqual(result['session_id'], str(_SESSION_ID))
+        self.assertEqual(result['payload_msg'], payload)
+
+    def test_audio_frame(self):
+        """测试352音频帧: 未压缩未序列化的载荷原样返回bytes"""
+        audio = bytes(range(256)) * 4
+        frame = _server_frame(audio, event=352, serial_method=NO_SERIALIZATION, compression_type=NO_COMPRESSION)
+
+        result = parse_response(frame)
+
+        self.assertEqual(result['event'], 352)
+        self.assertNotIn('seq', result)
+        self.assertIsInstance(result['payload_msg'], bytes)
+        self.assertEqual(result['payload_msg'], audio)
+        self.assertEqual(result['payload_size'], len(audio))
+
+    def test_error_response(self):
+        """测试错误响应帧解析错误码和载荷"""
+        body = gzip.compress(json.dumps({"error": "bad request"}).encode())
+        frame = (bytes(generate_header(message_type=SERVER_ERROR_RESPONSE))
+                 + struct.pack(">II", 45000001, len(body)) + body)
+
+        result = parse_response(frame)
+
+        self.assertEqual(result['code'], 45000001)
+        self.assertEqual(result['payload_msg'], {"error": "bad request"})
+
+    def test_truncated_frame(self):
+        """测试在定长字段处截断的帧抛出struct.error"""
+        frame = _server_frame(b"\x00" * 8, event=352, serial_method=NO_SERIALIZATION,
+                              compression_type=NO_COMPRESSION)
+        header_size = 4
+        # 分别截断在事件号、session_id长度、载荷长度字段中间
+        for cut in (header_size + 2, header_size + 4 + 2, header_size + 8 + len(_SESSION_ID) + 2):
+            with self.subTest(cut=cut):
+                with self.assertRaises(struct.error):
+                    parse_response(frame[:cut])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+火山引擎实时对话客户端单元测试
+
+测试VolcEngineRealtimeClient:
+1. 关闭连接时唤醒等待中的响应消费者
+2. 关闭后继续获取响应立即抛出异常
+3. 各请求帧与改造前逐段拼接的字节一致
+"""
+
+import asyncio
+import gzip
+import json
+import struct
+import unittest
+from unittest.mock import AsyncMock, patch
+
+import websockets
+from websockets.frames import Close
+
+# 项目路径由同目录的 conftest.py 统一配置
+import volcengine_client
+from protocol_parser import (
+    generate_header, SERVER_FULL_RESPONSE, CLIENT_AUDIO_ONLY_REQUEST, NO_SERIALIZATION, NO_COMPRESSION,
+)
+from volcengine_client import VolcEngineRealtimeClient
+
+
+def _server_frame(event: int, payload: dict, session_id: bytes = b"test-session") -> bytes:
+    """构造带事件号和session_id的服务器完整响应帧"""
+    body = gzip.compress(json.dumps(payload).encode())
+    return (bytes(generate_header(message_type=SERVER_FULL_RESPONSE))
+            + struct.pack(">II", event, len(session_id)) + session_id
+            + struct.pack(">I", len(body)) + body)
+
+
+class _FakeWebSocket:
+    """最小的WebSocket替身：recv按顺序返回预置帧，close后挂起的recv抛出ConnectionClosed"""
+
+    def __init__(self, frames):
+        self._incoming = asyncio.Queue()
+        for frame in frames:
+            self._incoming.put_nowait(frame)
+        self.sent = []
+
+    def feed(self, frame):
+        """追加一帧待recv返回的服务器响应"""
+        self._incoming.put_nowait(frame)
+
+    async def send(self, data):
+        self.sent.append(bytes(data))
+
+    async def recv(self):
+        item = await self._incoming.get()
+        if isinstance(item, BaseException):
+            raise item
+        return item
+
+    async def close(self):
+        close_frame = Close(1000, "")
+        self._incoming.put_nowait(websockets.exceptions.ConnectionClosedOK(close_frame, close_frame, True))
+
+
+_SESSION_ID = "test-session"
+_START_SESSION_REQ = {"tts": {"speaker": "测试音色", "audio_config": {"format": "pcm"}}}
+
+
+async def _connect_client(**config):
+    """用WebSocket替身建立连接：StartConnection和StartSession各返回一帧响应"""
+    config = {
+        'ws_connect_config': {'base_url': "wss://example.invalid", 'headers': {}},
+        'start_session_req': json.loads(json.dumps(_START_SESSION_REQ)),
+        **config,
+    }
+    ws = _FakeWebSocket([_server_frame(50, {}), _server_frame(150, {})])
+    client = VolcEngineRealtimeClient(config, _SESSION_ID)
+    with patch.object(volcengine_client.websockets, 'connect', AsyncMock(return_value=ws)):
+        await client.connect()
+    return client, ws
+
+
+def _baseline_request(event: int, payload_bytes: bytes, session_id: str = None, **header_kwargs) -> bytes:
+    """按改造前客户端的方式用bytearray逐段extend拼出请求帧"""
+    request = bytearray(generate_header(**header_kwargs))
+    request.extend(int(event).to_bytes(4, 'big'))
+    if session_id is not None:
+        request.extend((len(session_id)).to_bytes(4, 'big'))
+        request.extend(str.encode(session_id))
+    request.extend((len(payload_bytes)).to_bytes(4, 'big'))
+    request.extend(payload_bytes)
+    return bytes(request)
+
+
+class TestVolcEngineRealtimeClientClose(unittest.IsolatedAsyncioTestCase):
+    """VolcEngineRealtimeClient关闭流程测试类"""
+
+    async def asyncSetUp(self):
+        """测试前的设置"""
+        self.client, self.ws = await _connect_client()
+
+    async def test_close_wakes_waiting_receiver(self):
+        """测试close唤醒阻塞在receive_server_response上的消费者"""
+        receiver = asyncio.create_task(self.client.receive_server_response())
+        await asyncio.sleep(0)
+        self.assertFalse(receiver.done())
+
+        await self.client.close()
+
+        with self.assertRaises(websockets.exceptions.ConnectionClosed):
+            await asyncio.wait_for(receiver, timeout=1.0)
+
+    async def test_receive_after_close_raises(self):
+        """测试关闭后再次获取响应立即抛出异常而不是挂起"""
+        await self.client.close()
+        with self.assertRaises(websockets.exceptions.ConnectionClosed):
+            await asyncio.wait_for(self.client.receive_server_response(), timeout=1.0)
+        with self.assertRaises(websockets.exceptions.ConnectionClosed):
+            await asyncio.wait_for(self.client.receive_server_response(), timeout=1.0)
+
+
+class TestVolcEngineRealtimeClientFrames(unittest.IsolatedAsyncioTestCase):
+    """VolcEngineRealtimeClient请求帧字节测试类"""
+
+    async def asyncSetUp(self):
+        """测试前的设置"""
+        self.client, self.ws = await _connect_client()
+
+    async def asyncTearDown(self):
+        """测试后的清理"""
+        await self.client.close()
+
+    def _payload_of(self, frame: bytes, session_id: str = None) -> bytes:
+        """按协议布局取出帧尾部的载荷: header + event + [session_id长度 + session_id] + 载荷长度"""
+        offset = 4 + 4 + (4 + len(session_id) if session_id is not None else 0) + 4
+        return frame[offset:]
+
+    def assertGzipJsonFrame(self, frame: bytes, event: int, payload, session_id: str = None):
+        """断言帧与改造前拼法逐字节一致；gzip头带时间戳，压缩载荷按解压后的JSON比较"""
+        compressed = self._payload_of(frame, session_id)
+        self.assertEqual(frame, _baseline_request(event, compressed, session_id))
+        self.assertEqual(json.loads(gzip.decompress(compressed)), payload)
+
+    async def test_start_connection_frame(self):
+        """测试StartConnection帧: 事件1，不带session_id，载荷为{}"""
+        self.assertGzipJsonFrame(self.ws.sent[0], 1, {})
+
+    async def test_start_session_frame(self):
+        """测试StartSession帧: 事件100，带session_id，载荷为start_session_req"""
+        self.assertGzipJsonFrame(self.ws.sent[1], 100, _START_SESSION_REQ, _SESSION_ID)
+
+    async def test_batched_audio_frame(self):
+        """测试积压的多个PCM块合并为一个未压缩音频帧，字节按入队顺序拼接"""
+        chunks = [bytes([i]) * 320 for i in range(1, 4)]
+        for chunk in chunks:
+            await self.client.send_audio_data(chunk)
+        await self.client.flush()
+
+        audio_frames = self.ws.sent[2:]
+        self.assertEqual(len(audio_frames), 1)
+        # 默认不压缩音频，header中压缩方式为NO_COMPRESSION，载荷为原始PCM
+        self.assertEqual(audio_frames[0], _baseline_request(
+            200, b"".join(chunks), _SESSION_ID, message_type=CLIENT_AUDIO_ONLY_REQUEST,
+            serial_method=NO_SERIALIZATION, compression_type=NO_COMPRESSION))
+
+    async def test_gzip_audio_frame(self):
+        """测试开启compress_audio后音频帧与改造前一致：GZIP header + 压缩的拼接PCM"""
+        await self.client.close()
+        self.client, self.ws = await _connect_client(compress_audio=True)
+        chunks = [bytes([i]) * 320 for i in range(1, 4)]
+        for chunk in chunks:
+            await self.client.send_audio_data(chunk)
+        await self.client.flush()
+
+        audio_frames = self.ws.sent[2:]
+        self.assertEqual(len(audio_frames), 1)
+        compressed = self._payload_of(audio_frames[0], _SESSION_ID)
+        self.assertEqual(audio_frames[0], _baseline_request(
+            200, compressed, _SESSION_ID, message_type=CLIENT_AUDIO_ONLY_REQUEST, serial_method=NO_SERIALIZATION))
+        self.assertEqual(gzip.decompress(compressed), b"".join(chunks))
+
+    async def test_tts_boundary_frames(self):
+        """测试内容为空的TTS start/end边界帧与逐次构造的帧一致"""
+        for start, end in ((True, False), (False, True), (True, True)):
+            with self.subTest(start=start, end=end):
+                await self.client.chat_tts_text(False, start, end, "")
+                self.assertGzipJsonFrame(self.ws.sent[-1], 500, {"start": start, "end": end, "content": ""},
+                                         _SESSION_ID)
+
+    async def test_tts_text_frame(self):
+        """测试带内容的TTS文本帧"""
+        await self.client.chat_tts_text(False, False, False, "你好")
+        self.assertGzipJsonFrame(self.ws.sent[-1], 500, {"start": False, "end": False, "content": "你好"},
+                                 _SESSION_ID)
+
+    async def test_finish_session_frame(self):
+        """测试FinishSession帧: 事件102，带session_id，载荷为{}"""
+        await self.client.finish_session()
+        self.assertGzipJsonFrame(self.ws.sent[-1], 102, {}, _SESSION_ID)
+
+    async def test_finish_connection_frame(self):
+        """测试FinishConnection帧: 事件2，不带session_id，载荷为{}"""
+        self.ws.feed(_server_frame(52, {}))
+        await self.client.finish_connection()
+        self.assertGzipJsonFrame(self.ws.sent[-1], 2, {})
+
+
+if __name__ == '__main__':
+    unittest.main()